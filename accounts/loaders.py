@@ -0,0 +1,15 @@
+from bubblyb.utils import BatchLoader
+
+from . import presence
+
+
+class PresenceLoader(BatchLoader):
+    ''' online or not for every username on the page, one redis round trip '''
+    context_key = 'online'
+    empty = False
+
+    def batch_load(self, usernames):
+        try:
+            return presence.online(usernames)
+        except presence.UNAVAILABLE:
+            return {}
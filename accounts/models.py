@@ -82,18 +82,6 @@ class User(AbstractBaseUser, PermissionsMixin):
         "Does the user have permissions to view the app `app_label`?"
         return self.is_staff
 
-    # def last_seen(self):
-    #     return cache.get('seen_%s' % self.username)
-    # def online(self):
-    #     if self.last_seen():
-    #         now = datetime.datetime.now()
-    #         if now > self.last_seen() + datetime.timedelta(
-    #                     seconds=60*5):
-    #             return False
-    #         else:
-    #             return True
-    #     else:
-    #         return False
 
 # from django.contrib.auth.backends import ModelBackend
 # class EmailBackend(ModelBackend):
@@ -0,0 +1,82 @@
+'''
+Who is online, for the chat UI
+
+A user is online while their entry in the `presence` sorted set scores
+in the future. Sockets only write on connect and disconnect; while they
+stay open, the Heartbeat of their worker refreshes every user it holds a
+socket of with one pipeline per HEARTBEAT seconds, no matter how many
+there are. Connections are also counted per user across workers, so
+closing the last socket takes you offline right away, while a worker
+that dies just lets its users expire after ONLINE_TTL.
+'''
+import time
+
+from bubblyb.utils.heartbeat import LoopHeartbeat
+from bubblyb.utils.shared_redis import get_redis, UNAVAILABLE
+
+HEARTBEAT = 20
+ONLINE_TTL = HEARTBEAT * 3 # a couple of missed beats before dropping someone
+
+PRESENCE_KEY = 'presence'
+
+
+def _conns_key(username):
+    return 'presence_conns_%s' % username
+
+
+def connected(username):
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zadd(PRESENCE_KEY, {username: time.time() + ONLINE_TTL})
+    pipe.incr(_conns_key(username))
+    pipe.expire(_conns_key(username), ONLINE_TTL)
+    pipe.execute()
+
+
+def disconnected(username):
+    redis = get_redis()
+    if redis.decr(_conns_key(username)) <= 0:
+        pipe = redis.pipeline(transaction=False)
+        pipe.delete(_conns_key(username))
+        pipe.zrem(PRESENCE_KEY, username)
+        pipe.execute()
+
+
+def beat(usernames):
+    now = time.time()
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zadd(PRESENCE_KEY, {username: now + ONLINE_TTL for username in usernames})
+    for username in usernames:
+        pipe.expire(_conns_key(username), ONLINE_TTL)
+    pipe.zremrangebyscore(PRESENCE_KEY, '-inf', now) # whoever a dead worker left behind
+    pipe.execute()
+
+
+def online(usernames):
+    ''' {username: bool} in one round trip '''
+    usernames = list(usernames)
+    if not usernames:
+        return {}
+    pipe = get_redis().pipeline(transaction=False)
+    for username in usernames:
+        pipe.zscore(PRESENCE_KEY, username)
+    now = time.time()
+    return {
+        username: score is not None and score > now
+        for username, score in zip(usernames, pipe.execute())
+    }
+
+
+class Heartbeat(LoopHeartbeat):
+    ''' the users this worker holds sockets of. nobody shows up online without redis, chat still works '''
+    interval = HEARTBEAT
+
+    def start(self, username):
+        connected(username)
+    def stop(self, username):
+        disconnected(username)
+    def beat(self, usernames):
+        beat(usernames)
+
+
+def get_heartbeat():
+    return Heartbeat.for_loop()
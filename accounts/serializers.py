@@ -1,12 +1,24 @@
 from rest_framework import serializers
 
 from .models import User
-from relationships.models import Block
+from .loaders import PresenceLoader
+from relationships.loaders import (
+    EDGE_LOADERS,
+    YouFollowLoader,
+    FollowsYouLoader,
+    YouBlockLoader,
+    BlocksYouLoader,
+)
 from communities.models import Membership
 
 from communities.serializers import MembershipSerializer
 
-from bubblyb.utils import DynamicFieldsMixin, LoggedInExclsvFldsMixin, NestedFlattenerMixin
+from bubblyb.utils import (
+    DynamicFieldsMixin,
+    LoggedInExclsvFldsMixin,
+    NestedFlattenerMixin,
+    PrimedListSerializer,
+)
 
 class UserCreateSerializer(serializers.ModelSerializer):
     superuser = serializers.BooleanField(label='superuser bruh')
@@ -86,7 +98,7 @@ class EmailSerializer(serializers.ModelSerializer, PasswordUpdateSerializer):
 class UserPeakSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     '''
         Custom fields: FAVE_COLOR, PROFILE_PIC, COVER_PHOTO, BIO,
-        BLOCKED, FOLLOWS_YOU, YOU_FOLLOW
+        BLOCKED, FOLLOWS_YOU, YOU_FOLLOW, ONLINE
     '''
     dyna_fld_kwarg = 'profile_flds'
 
@@ -100,16 +112,23 @@ class UserPeakSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
         return obj.bio
 
     def get_blocks_you(self, obj):
-        return Block.blocked(obj, self.context['request'].user)
+        return BlocksYouLoader.of(self.context).load(obj.username)
     def get_you_block(self, obj):
-        return Block.blocked(self.context['request'].user, obj)
+        return YouBlockLoader.of(self.context).load(obj.username)
     def get_follows_you(self, obj):
-        return obj.from_user.filter(to_user=self.context['request'].user).exists()
+        return FollowsYouLoader.of(self.context).load(obj.username)
     def get_you_follow(self, obj):
-        try:
-            return obj.follows.filter(from_user=self.context['request'].user).exists()
-        except TypeError:
+        if self.context['request'].user.is_anonymous:
             return "_"
+        return YouFollowLoader.of(self.context).load(obj.username)
+    def get_online(self, obj):
+        return PresenceLoader.of(self.context).load(obj.username)
+
+    def prime(self, users):
+        usernames = [user.username for user in users]
+        for field, loader in dict(EDGE_LOADERS, online=PresenceLoader).items():
+            if field in self.fields:
+                loader.of(self.context).prime(usernames)
 
     class Meta:
         model = User
@@ -117,6 +136,7 @@ class UserPeakSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
             'username',
             'alias',
         )
+        list_serializer_class = PrimedListSerializer
 
 
 class UserDetailSerializer(LoggedInExclsvFldsMixin, UserPeakSerializer):
@@ -15,6 +15,7 @@ from posts.models import Post, Comment, Content
 from communities.models import Membership
 from relationships.models import Block
 from chat.models import Room
+from notification.models import Notification
 
 from . import serializers
 from posts.serializers import (
@@ -172,8 +173,8 @@ class UserCommentAPIView(UserPostsAPIView):
     def get_big_queryset(self):
         qs = Comment.objects.all()
         them = self.get_user_object()
-        q = Q(allocated_to__is_secret=False
-                ) | Q(allocated_to__in=Membership.get_mutual_communities(self.request.user, them))
+        q = Q(on__allocated_to__is_secret=False
+                ) | Q(on__allocated_to__in=Membership.get_mutual_communities(self.request.user, them))
         qs = qs.filter(q, content__author=them)
         return qs
 
@@ -233,15 +234,8 @@ class AccountHeadsUp(APIView):
             return Response({"detail": "Authentication credentials were not provided."},
                 status.HTTP_401_UNAUTHORIZED)
 
-        mate_obj = user.joined_chats.order_by('room__message__timestamp').last()
-        has_unread = False
-        if mate_obj:
-            mate_obj__time = mate_obj.last_seen
-            msg_obj__time = get_first_time(mate_obj.room.message_set)
-            has_unread = mate_obj__time < msg_obj__time
-
         data = {
-            "lastest_noti": get_first_time(user.noti_receiver.all()),
-            "has_unread_msg": has_unread
+            "lastest_noti": get_first_time(Notification.objects.visible_to(user)),
+            "has_unread_msg": user.joined_chats.filter(unread_count__gt=0).exists()
         }
         return Response(data, status.HTTP_200_OK)
\ No newline at end of file
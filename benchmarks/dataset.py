@@ -0,0 +1,193 @@
+'''
+Synthetic dataset for the benchmarks
+
+Everything goes in with bulk_create so no signals fire (no pushes, no
+feed fan-out) and seeding stays fast at big scales. Denormalized
+counters are fixed up with reconcile_counters afterwards.
+Same seed and scale always give the same rows.
+'''
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+
+from accounts.models import User
+from communities.models import Community, Membership
+from posts.models import Content, Attachment, Post, Comment
+from reacts.models import Icon, Reaction
+from relationships.models import Relationship, Block
+from chat.models import Room, PublicRoom, Direct, Roommate, Message
+from notification.models import Notification
+
+DEFAULT_SCALE = {
+    'users': 200,
+    'communities': 20,
+    'memberships': 10, # communities joined per user
+    'posts': 2000,
+    'comments': 5,     # per post
+    'reactions': 8,    # per post
+    'follows': 15,     # per user
+    'rooms': 30,
+    'messages': 3000,
+}
+BATCH_SIZE = 1000
+
+
+def _create(model, objs):
+    # django 3.0 doesn't cap batch_size at what the backend can take (sqlite can't take much)
+    fields = model._meta.concrete_fields
+    model.objects.bulk_create(objs, batch_size=min(BATCH_SIZE, connection.ops.bulk_batch_size(fields, objs)))
+
+
+def _bulk(model, objs):
+    ''' bulk_create then read the pks back, not every backend returns them '''
+    _create(model, objs)
+    return list(model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objs)])[::-1]
+
+
+class Dataset(object):
+    ''' what the endpoints need to fill their url kwargs '''
+    def __init__(self, me, community, post, room):
+        self.me = me
+        self.community = community
+        self.post = post
+        self.room = room
+
+
+def generate(scale=None, seed=0):
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    rand = random.Random(seed)
+
+    password = make_password(None)
+    usernames = [f'user{i}' for i in range(scale['users'])]
+    _create(User, [
+        User(username=name, email=f'{name}@bench.local', alias=name.title(),
+            password=password)
+        for name in usernames
+    ])
+    me = usernames[0]
+
+    cmty_ids = [f'cmty{i}' for i in range(scale['communities'])]
+    _create(Community, [
+        Community(id=cid, name=f'Community {i}', is_secret=(i % 10 == 9))
+        for i, cid in enumerate(cmty_ids)
+    ])
+
+    joined = {}
+    ships = []
+    for name in usernames:
+        picks = rand.sample(cmty_ids, min(scale['memberships'], len(cmty_ids)))
+        if name == me:
+            picks = cmty_ids
+        joined[name] = picks
+        for cid in picks:
+            role = Membership.ADMINISTRATOR if name == me else \
+                rand.choice((Membership.MEMBER,) * 8 + (Membership.MODERATOR, Membership.BANNED))
+            ships.append(Membership(user_id=name, community_id=cid, role=role,
+                reputation_point=rand.randint(1, 500)))
+    _create(Membership, ships)
+
+    icon_ids = _bulk(Icon, [
+        Icon(uploader_id=me, name=f'icon{i}', img_src=f'https://img.bench.local/{i}.png',
+            belongs_to_id=None if i < 4 else cmty_ids[i % len(cmty_ids)])
+        for i in range(12)
+    ])
+
+    follows = []
+    for name in usernames:
+        for other in rand.sample(usernames, min(scale['follows'], len(usernames))):
+            if other != name:
+                follows.append(Relationship(from_user_id=name, to_user_id=other))
+    _create(Relationship, follows)
+    _create(Block, [
+        Block(blocker_id=name, got_blokt_id=me) for name in usernames[-3:] if name != me
+    ])
+
+    # posts, then comments, each one backed by a Content row
+    authors = [rand.choice(usernames) for _ in range(scale['posts'])]
+    post_ids = _bulk(Content, [
+        Content(author_id=author, text=f'post {i} ' * rand.randint(1, 60))
+        for i, author in enumerate(authors)
+    ])
+    _create(Post, [
+        Post(content_id=pk, slug=f'post-{pk}', title=f'Post {i}', hot_score=rand.randint(0, 10**6),
+            allocated_to_id=rand.choice(joined[authors[i]]))
+        for i, pk in enumerate(post_ids)
+    ])
+    _create(Attachment, [
+        Attachment(to_id=pk, type=2, content=f'https://img.bench.local/a{pk}_{n}.png', order=n)
+        for pk in post_ids for n in range(rand.randint(0, 4))
+    ])
+
+    on = [post_ids[i % len(post_ids)] for i in range(scale['posts'] * scale['comments'])]
+    comment_ids = _bulk(Content, [
+        Content(author_id=rand.choice(usernames), text=f'comment {i}')
+        for i in range(len(on))
+    ])
+    comments = []
+    top_level = {}
+    for pk, post_id in zip(comment_ids, on):
+        parent = top_level.get(post_id) if rand.random() < 0.3 else None
+        comments.append(Comment(content_id=pk, on_id=post_id, reply_to_id=parent))
+        top_level.setdefault(post_id, pk)
+    _create(Comment, comments)
+
+    reactions = []
+    for post_id in post_ids:
+        for name in rand.sample(usernames, min(scale['reactions'], len(usernames))):
+            reactions.append(Reaction(user_id=name, to_id=post_id, icon_id=rand.choice(icon_ids)))
+    _create(Reaction, reactions)
+
+    # chat: one public room per community, the rest are directs and groups with `me` in them
+    room_ids = _bulk(Room, [Room(name=f'Room {i}') for i in range(scale['rooms'])])
+    _create(PublicRoom, [
+        PublicRoom(room_id=pk, associated_with_id=cid, description="bench room", order=1)
+        for pk, cid in zip(room_ids, cmty_ids)
+    ])
+    mates, directs = [], []
+    private_rooms = room_ids[len(cmty_ids):]
+    for i, pk in enumerate(private_rooms):
+        others = rand.sample(usernames[1:], 1 if i % 2 else min(5, len(usernames) - 1))
+        if i % 2:
+            directs.append(Direct(room_id=pk, u1_id=me, u2_id=others[0]))
+        for name in [me] + others:
+            mates.append(Roommate(room_id=pk, identity_id=name, is_admin=(name == me)))
+    for pk, cid in zip(room_ids, cmty_ids):
+        mates.append(Roommate(room_id=pk, identity_id=me, is_admin=True))
+    _create(Direct, directs)
+    _create(Roommate, mates)
+
+    members = {}
+    for mate in mates:
+        members.setdefault(mate.room_id, []).append(mate.identity_id)
+    _create(Message, [
+        Message(thread_id=pk, author_id=rand.choice(members[pk]), content=f'message {i}')
+        for i, pk in enumerate(rand.choice(room_ids) for _ in range(scale['messages']))
+    ])
+    call_command('reconcile_counters', stdout=open('/dev/null', 'w'))
+
+    # a notification for every reaction and comment on `me`'s posts
+    content_ct = ContentType.objects.get_for_model(Content)
+    reaction_ct = ContentType.objects.get_for_model(Reaction)
+    comment_ct = ContentType.objects.get_for_model(Comment)
+    notis = []
+    for reaction in Reaction.objects.filter(to__author=me).exclude(user=me):
+        notis.append(Notification(receiver_id=me, actor_id=reaction.user_id, verb=Notification.REACT,
+            action_object_content_type=reaction_ct, action_object_object_id=reaction.pk,
+            target_content_type=content_ct, target_object_id=reaction.to_id))
+    for comment in Comment.objects.filter(on__content__author=me).select_related('content'):
+        notis.append(Notification(receiver_id=me, actor_id=comment.content.author_id,
+            verb=Notification.COMMENT,
+            action_object_content_type=comment_ct, action_object_object_id=comment.pk,
+            target_content_type=content_ct, target_object_id=comment.on_id))
+    _create(Notification, notis)
+
+    busiest = Post.objects.filter(allocated_to__is_secret=False).order_by('-reply_count', 'pk').first()
+    return Dataset(
+        me = User.objects.get(pk=me),
+        community = busiest.allocated_to_id,
+        post = busiest.pk,
+        room = private_rooms[0] if private_rooms else room_ids[0],
+    )
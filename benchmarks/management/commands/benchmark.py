@@ -0,0 +1,113 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment, override_settings
+
+from benchmarks import dataset, runner
+from bubblyb.testing import NoMigrations
+
+BUDGETS = os.path.join(os.path.dirname(dataset.__file__), 'budgets.json')
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+LATENCY_FLOOR_MS = 5 # jitter on fast endpoints shouldn't fail the run
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database and check every list endpoint against its query/latency budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help="Timed requests per endpoint")
+        parser.add_argument('--scale', nargs='*', default=[], metavar='KEY=N',
+            help="Override dataset sizes, e.g. --scale posts=10000 users=1000")
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--only', metavar='REGEX', help="Only endpoints whose label matches")
+        parser.add_argument('--update-budgets', action='store_true',
+            help="Write the measured numbers to budgets.json instead of checking them")
+        parser.add_argument('--latency-slack', type=float, default=1.5,
+            help="p95 may be this many times the budget before failing, 0 skips latency checks")
+
+    def handle(self, *args, **options):
+        budgets = self.load_budgets()
+        scale = dict(budgets.get('dataset', {}))
+        stored_seed = scale.pop('seed', 0)
+        seed = stored_seed if options['seed'] is None else options['seed']
+        for pair in options['scale']:
+            key, _, value = pair.partition('=')
+            if key not in dataset.DEFAULT_SCALE or not value.isdigit():
+                raise CommandError(f"Bad --scale {pair}, keys are {', '.join(dataset.DEFAULT_SCALE)}")
+            scale[key] = int(value)
+        scale = dict(dataset.DEFAULT_SCALE, **scale)
+        same_dataset = dict(scale, seed=seed) == budgets.get('dataset')
+
+        setup_test_environment(debug=False) # budgets are without the debug toolbar
+        with override_settings(MIGRATION_MODULES=NoMigrations()): # there are none in the repo
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(CACHES=LOCAL_CACHES):
+                self.stdout.write(f"Seeding {scale} seed={seed}")
+                data = dataset.generate(scale, seed)
+                results = list(runner.run(data, options['runs'], options['only']))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['update_budgets']:
+            self.save_budgets(budgets, results, dict(scale, seed=seed), options['only'])
+            return
+        if not same_dataset:
+            self.stdout.write(self.style.WARNING("Dataset differs from the one budgets.json was recorded with, not checking"))
+        failures = self.report(results, budgets.get('endpoints', {}) if same_dataset else None,
+            options['latency_slack'])
+        if failures:
+            raise CommandError(f"{failures} endpoint(s) over budget")
+
+    def load_budgets(self):
+        try:
+            with open(BUDGETS) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_budgets(self, budgets, results, scale, only):
+        endpoints = budgets.get('endpoints', {}) if only else {}
+        for result in results:
+            endpoints[result.label] = {
+                'status': result.status,
+                'queries': result.queries,
+                'rows': result.rows,
+                'p95_ms': round(result.p95, 1),
+            }
+        with open(BUDGETS, 'w') as f:
+            json.dump({'dataset': scale, 'endpoints': endpoints}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        self.report(results, None, 0)
+        self.stdout.write(f"Wrote {len(endpoints)} budgets to {BUDGETS}")
+
+    def report(self, results, budgets, slack):
+        failures = 0
+        self.stdout.write(f"{'endpoint':70} {'status':>6} {'queries':>7} {'rows':>7} {'p50ms':>8} {'p95ms':>8}")
+        for result in results:
+            problems = []
+            if budgets is not None:
+                budget = budgets.get(result.label)
+                if budget is None:
+                    problems.append("no budget")
+                else:
+                    if result.status != budget['status']:
+                        problems.append(f"status {budget['status']}")
+                    if result.queries > budget['queries']:
+                        problems.append(f"queries > {budget['queries']}")
+                    if result.rows > budget['rows']:
+                        problems.append(f"rows > {budget['rows']}")
+                    allowed = max(budget['p95_ms'] * slack, budget['p95_ms'] + LATENCY_FLOOR_MS)
+                    if slack and result.p95 > allowed:
+                        problems.append(f"p95 > {allowed:.1f}ms")
+            line = f"{result.label:70} {result.status:>6} {result.queries:>7} {result.rows:>7} " \
+                f"{result.p50:>8.1f} {result.p95:>8.1f}"
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"{line}  {', '.join(problems)}"))
+            else:
+                self.stdout.write(line)
+        return failures
@@ -0,0 +1,136 @@
+'''
+Drives every ListAPIView through the DRF test client and measures it.
+
+Endpoints are found by walking the url conf, so a new list view shows
+up here (and fails for lack of a budget) without touching this file.
+'''
+import re
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, URLResolver
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+APPS = ('posts', 'communities', 'accounts', 'chat', 'notification', 'reacts')
+
+# some views read query params, run those variants too
+VARIANTS = {
+    'PostFeedAPIView': ('', '?sort_by=new', '?sort_by=best&last_x_days=30'),
+    'CommentListAPIView': ('', '?sort_by=best'),
+    'CommunityListAPIView': ('', '?sortby=most_mems', '?sortby=growing'),
+    'CommunityMemberListAPIView': ('', '?filter_by=mod_team'),
+    'FollowListAPIView': ('', '?get_followers=1'),
+    'UserListAPIView': ('', '?minimal=1'),
+}
+
+
+def _walk(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, route)
+        else:
+            yield route, pattern
+
+
+def list_endpoints():
+    ''' (view class, route) for every list view of APPS '''
+    seen = set()
+    for route, pattern in _walk(get_resolver().url_patterns):
+        view = getattr(pattern.callback, 'view_class', None)
+        if view is None or not issubclass(view, ListAPIView):
+            continue
+        if view.__module__.split('.')[0] not in APPS or route in seen:
+            continue
+        seen.add(route)
+        yield view, '/' + route
+
+
+def fill_route(route, app, dataset):
+    ''' put dataset ids in place of the <kwargs> of a route '''
+    values = {
+        'username': dataset.me.username,
+        'content_id': str(dataset.post),
+        'id': str(dataset.room) if app == 'chat' else dataset.community,
+    }
+    return re.sub(r'<(?:\w+:)?(\w+)>', lambda m: values[m.group(1)], route)
+
+
+@contextmanager
+def count_rows():
+    ''' counts rows coming out of every cursor while active '''
+    fetched = [0]
+    originals = {name: getattr(CursorWrapper, name, None) for name in ('fetchone', 'fetchmany', 'fetchall')}
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        fetched[0] += row is not None
+        return row
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        fetched[0] += len(rows)
+        return rows
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        fetched[0] += len(rows)
+        return rows
+
+    CursorWrapper.fetchone, CursorWrapper.fetchmany, CursorWrapper.fetchall = fetchone, fetchmany, fetchall
+    try:
+        yield fetched
+    finally:
+        for name, original in originals.items():
+            if original is None:
+                delattr(CursorWrapper, name)
+            else:
+                setattr(CursorWrapper, name, original)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[int(round((len(ordered) - 1) * pct / 100))]
+
+
+class Result(object):
+    def __init__(self, label, status, queries, rows, timings):
+        self.label = label
+        self.status = status
+        self.queries = queries
+        self.rows = rows
+        self.p50 = percentile(timings, 50) * 1000
+        self.p95 = percentile(timings, 95) * 1000
+
+
+def measure(client, label, url, runs):
+    client.get(url) # warm up, budgets are for the steady state
+    with CaptureQueriesContext(connection) as queries, count_rows() as rows:
+        response = client.get(url)
+    query_count = len(queries) # the next request resets connection.queries
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        client.get(url)
+        timings.append(time.perf_counter() - started)
+    return Result(label, response.status_code, query_count, rows[0], timings)
+
+
+def run(dataset, runs=20, only=None):
+    client = APIClient()
+    client.force_authenticate(dataset.me)
+    client.raise_request_exception = False # a 500 is a result too
+    # the throttle classes are bound at import time, so settings can't turn them off
+    with mock.patch.object(APIView, 'check_throttles', lambda self, request: None):
+        for view, route in list_endpoints():
+            app = view.__module__.split('.')[0]
+            url = fill_route(route, app, dataset)
+            for variant in VARIANTS.get(view.__name__, ('',)):
+                label = f'{view.__name__} {route}{variant}'
+                if only and not re.search(only, label):
+                    continue
+                yield measure(client, label, url + variant, runs)
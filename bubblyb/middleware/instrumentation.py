@@ -0,0 +1,102 @@
+'''
+Per view timing and query metrics, safe to leave on in production
+
+InstrumentationMiddleware times every request and installs a db
+execute_wrapper that counts and times the SQL it runs, without needing
+DEBUG (connection.queries). Numbers go into the in-process histograms of
+bubblyb.utils.metrics that metrics_view serves in the prometheus text
+format, so every worker process has its own, scrape them all.
+
+Serializer time is the view's own time up to its Response, minus the
+SQL it ran: what a DRF view does there is mostly serializing, whichever
+serializer it uses. Render time is the renderer turning that into bytes.
+Views that don't return a Response (TemplateResponse really) have neither.
+
+Slow requests can also be logged to the 'bubblyb.slow' logger with
+their worst query. SLOW_REQUEST_MS turns that on and
+SLOW_REQUEST_SAMPLE_RATE keeps only a fraction of them.
+
+Chat consumers don't go through middlewares, decorate their handlers
+with bubblyb.utils.instrumented('name') instead.
+'''
+import time
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from bubblyb.utils.metrics import (
+    SECONDS, QUERIES, BYTES, observe, current, tracking, log_if_slow, exposition,
+)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return f'{match.func.__module__}.{match.func.__name__}'
+
+
+class InstrumentationMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with tracking() as metrics:
+            response = self.get_response(request)
+        took = time.perf_counter() - started
+
+        view = _view_name(request)
+        size = 0 if response.streaming else len(response.content)
+        observe('http_request_seconds', SECONDS, took,
+            view=view, method=request.method, status=response.status_code)
+        observe('http_sql_queries', QUERIES, metrics.sql_count, view=view)
+        observe('http_sql_seconds', SECONDS, metrics.sql_time, view=view)
+        observe('http_serializer_seconds', SECONDS, metrics.serializer_time, view=view)
+        observe('http_render_seconds', SECONDS, metrics.render_time, view=view)
+        observe('http_response_bytes', BYTES, size, view=view)
+        log_if_slow(view, took, metrics,
+            method=request.method, path=request.path, status=response.status_code, bytes=size)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current()
+        if metrics is not None:
+            request._instrumentation = (time.perf_counter(), metrics.sql_time)
+
+    def process_template_response(self, request, response):
+        metrics = current()
+        view_started = getattr(request, '_instrumentation', None)
+        if metrics is None or view_started is None:
+            return response
+        started, sql_time = view_started
+        now = time.perf_counter()
+        metrics.serializer_time = max(now - started - (metrics.sql_time - sql_time), 0)
+
+        def rendered(response):
+            metrics.render_time = time.perf_counter() - now
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def _may_scrape(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        auth = request.META.get('HTTP_AUTHORIZATION', '')
+        if constant_time_compare(auth, f'Bearer {token}'):
+            return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    # REMOTE_ADDR is the proxy's in production, only trusted for local dev
+    return settings.DEBUG and request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+
+def metrics_view(request):
+    '''
+    prometheus text format. Scrapers send "Authorization: Bearer
+    <METRICS_TOKEN>", staff can look at it logged in
+    '''
+    if not _may_scrape(request):
+        raise Http404
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4')
@@ -49,10 +49,12 @@ INSTALLED_APPS = [
     'reacts',
     'notification',
     'chat',
-    'storagelayer'
+    'storagelayer',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'bubblyb.middleware.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,7 +63,6 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
-    # 'bubblyb.middleware.beingActive.ActiveUserMiddleware'
 ]
 
 ROOT_URLCONF = 'bubblyb.urls'
@@ -113,6 +114,7 @@ _POSTGRES = {
 DATABASES = {
     'default': _SQLITE
 }
+TEST_RUNNER = 'bubblyb.testing.TestRunner' # no migrations or redis needed
 
 
 # Password validation
@@ -189,8 +191,20 @@ CACHES = {
 }
 
 CORS_ORIGIN_WHITELIST = [os.getenv('CLIENT_HOST'),]
+CORS_EXPOSE_HEADERS = ['X-Has-More', 'X-Before-Cursor', 'X-After-Cursor', # chat history
+    'X-Next-Cursor'] # PaginationMixin lists
 ALLOWED_HOSTS = ['localhost', '127.0.0.1'] # websocket
-INTERNAL_IPS = ['127.0.0.1'] # debug toolbar
+INTERNAL_IPS = ['127.0.0.1'] # debug toolbar, /__metrics__ while DEBUG
+
+# scrapers of /__metrics__ send "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# log requests slower than this to 'bubblyb.slow', 0 turns it off
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500)) or None
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', 1))
+
+# notification.dispatcher.FakeTransport keeps pushes in memory instead
+PUSH_TRANSPORT = os.getenv('PUSH_TRANSPORT', 'notification.dispatcher.OneSignalTransport')
 
 JWT_AUTH = {
     'JWT_ALLOW_REFRESH': True,
@@ -0,0 +1,36 @@
+'''
+What throwaway databases need, for the test runner and the benchmark
+command. The repo ships no migrations, so tables come straight from
+the models (like migrate --run-syncdb), and redis, channels and
+OneSignal are swapped for in-process stand-ins
+'''
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class NoMigrations(dict):
+    ''' MIGRATION_MODULES saying "none" for every app '''
+    def __contains__(self, app_label):
+        return True
+
+    def __getitem__(self, app_label):
+        return None
+
+
+TEST_SETTINGS = {
+    'MIGRATION_MODULES': NoMigrations(),
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    'PUSH_TRANSPORT': 'notification.dispatcher.FakeTransport',
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.overrides = override_settings(**TEST_SETTINGS)
+        self.overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.overrides.disable()
+        super().teardown_test_environment(**kwargs)
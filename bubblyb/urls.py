@@ -17,6 +17,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 
+from bubblyb.middleware.instrumentation import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('communities/', include('communities.urls')),
@@ -29,6 +31,7 @@ urlpatterns = [
     path('chat/', include('chat.urls')),
     path('moderation/', include('mod_tools.urls')),
     path('storage-layer/', include('storagelayer.urls')),
+    path('__metrics__', metrics_view),
 ]
 
 
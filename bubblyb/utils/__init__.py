@@ -8,4 +8,14 @@ from .drf_serializer_mixins import (
     NestedFlattenerMixin,
 )
 
-from .neat_wrappers import perf_timer, count_db_hits
\ No newline at end of file
+from .neat_wrappers import perf_timer, count_db_hits
+
+from .metrics import instrumented
+
+from .batch_loaders import BatchLoader, PrimedListSerializer
+
+from .two_tier_cache import TwoTierCache
+
+from .render_plans import render
+
+from .generic_relations import resolve_generic
@@ -0,0 +1,48 @@
+from django.db import models
+from rest_framework.serializers import ListSerializer
+
+
+class BatchLoader(object):
+    '''
+    Request scoped dataloader, lives in the serializer context.
+    Keys get primed with a whole page first so the first load()
+    fetches all of them at once instead of one query per row
+    '''
+    context_key = ''
+    empty = None # for keys batch_load found nothing for
+
+    def __init__(self, context):
+        self.context = context
+        self._cache = {}
+        self._pending = set()
+
+    @classmethod
+    def of(cls, context):
+        if cls.context_key not in context:
+            context[cls.context_key] = cls(context)
+        return context[cls.context_key]
+
+    def prime(self, keys):
+        self._pending.update(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending.add(key)
+            self._cache.update(self.batch_load(self._pending))
+            for pending in self._pending:
+                self._cache.setdefault(pending, self.empty)
+            self._pending = set()
+        return self._cache[key]
+
+    def batch_load(self, keys):
+        ''' returns {key: value} '''
+        raise NotImplementedError
+
+
+class PrimedListSerializer(ListSerializer):
+    ''' Hands the whole page to child.prime() before rendering it '''
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        objs = list(iterable)
+        self.child.prime(objs)
+        return super().to_representation(objs)
@@ -0,0 +1,32 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
+
+def resolve_generic(objs, field_name, select_related=None):
+    '''
+    Fills the GenericForeignKey `field_name` of every obj with one
+    in_bulk query per content type, instead of one query per obj.
+    select_related maps a model to what to join in along with it, e.g.
+    {Reaction: ('icon',)}
+    '''
+    if not objs:
+        return
+    field = objs[0]._meta.get_field(field_name)
+    wanted = defaultdict(set) # content type id -> object ids
+    for obj in objs:
+        ct_id = getattr(obj, field.ct_field + '_id')
+        if ct_id is not None:
+            wanted[ct_id].add(getattr(obj, field.fk_field))
+
+    found = {}
+    for ct_id, ids in wanted.items():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        qs = model._base_manager.select_related(*(select_related or {}).get(model, ()))
+        pks = {model._meta.pk.to_python(pk): pk for pk in ids}
+        for pk, related in qs.in_bulk(list(pks)).items():
+            found[ct_id, pks[pk]] = related
+
+    for obj in objs:
+        key = (getattr(obj, field.ct_field + '_id'), getattr(obj, field.fk_field))
+        field.set_cached_value(obj, found.get(key))
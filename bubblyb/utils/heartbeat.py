@@ -0,0 +1,71 @@
+'''
+Keeping redis entries alive for the sockets a worker holds
+
+Sockets only write on connect and disconnect. While they stay open, the
+worker's heartbeat refreshes everything it holds with one call every
+`interval` seconds, no matter how many sockets there are, and entries of
+a worker that dies just expire.
+'''
+import asyncio
+import weakref
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+
+from .shared_redis import UNAVAILABLE
+
+
+class LoopHeartbeat(object):
+    '''
+    Counts the keys this worker holds sockets of. Subclasses do the redis
+    side: start() for the first socket of a key, stop() after the last
+    one, beat() with every held key each interval. Those are sync and run
+    in a thread, if redis is unavailable they're skipped
+    '''
+    interval = 20
+
+    def __init__(self):
+        self.held = Counter()
+        self.task = None
+
+    def start(self, key):
+        raise NotImplementedError
+    def stop(self, key):
+        raise NotImplementedError
+    def beat(self, keys):
+        raise NotImplementedError
+
+    async def join(self, key):
+        self.held[key] += 1
+        if self.held[key] == 1:
+            await self._call(self.start, key)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    async def leave(self, key):
+        self.held[key] -= 1
+        if self.held[key] <= 0:
+            del self.held[key]
+            await self._call(self.stop, key)
+
+    async def run(self):
+        while self.held:
+            await asyncio.sleep(self.interval)
+            if self.held:
+                await self._call(self.beat, list(self.held))
+
+    async def _call(self, func, *args):
+        try:
+            await sync_to_async(func, thread_sensitive=False)(*args)
+        except UNAVAILABLE:
+            pass
+
+    _per_loop = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_loop(cls):
+        ''' one per event loop, so one per worker '''
+        instances = cls._per_loop.setdefault(asyncio.get_event_loop(), {})
+        if cls not in instances:
+            instances[cls] = cls()
+        return instances[cls]
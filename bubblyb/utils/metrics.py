@@ -0,0 +1,174 @@
+'''
+Timing and query metrics kept in process
+
+Histograms for whatever observe() is given and a thread local Metrics
+that tracking() fills with the sql of the code it wraps.
+bubblyb.middleware.instrumentation feeds them per request and serves
+them, @instrumented('name') does the same for chat consumer handlers,
+which don't go through middlewares.
+'''
+import asyncio
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('bubblyb.slow')
+
+SECONDS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200)
+BYTES = (1000, 5000, 20000, 100000, 500000, 2000000)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last one is +Inf
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            yield bound, cumulative
+        yield 'sum', total
+
+
+_registry = {} # (metric, labels) -> Histogram
+_registry_lock = threading.Lock()
+
+def observe(metric, buckets, value, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    histogram = _registry.get(key)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _registry.setdefault(key, Histogram(buckets))
+    histogram.observe(value)
+
+
+class Metrics(object):
+    ''' what one request (or consumer call) did, lives in a thread local '''
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0
+        self.worst_sql = (0, '')
+        # filled in by the middleware for views that return a DRF Response
+        self.serializer_time = 0
+        self.render_time = 0
+
+_local = threading.local()
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def record_sql(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics = current()
+        if metrics is not None:
+            took = time.perf_counter() - started
+            metrics.sql_count += 1
+            metrics.sql_time += took
+            if took > metrics.worst_sql[0]:
+                metrics.worst_sql = (took, sql)
+
+
+@contextmanager
+def tracking():
+    ''' fresh Metrics for this thread plus the sql wrapper on every connection '''
+    previous = current()
+    metrics = _local.metrics = Metrics()
+    try:
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(record_sql))
+            yield metrics
+    finally:
+        _local.metrics = previous
+
+
+def log_if_slow(label, took, metrics, **extra):
+    slow_ms = getattr(settings, 'SLOW_REQUEST_MS', None)
+    if slow_ms is None or took * 1000 < slow_ms:
+        return
+    if random.random() >= getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 1):
+        return
+    worst_time, worst_sql = metrics.worst_sql
+    logger.warning(
+        "slow %s %.0fms sql=%d/%.0fms serializer=%.0fms render=%.0fms %s worst_sql=%.0fms %s",
+        label, took * 1000, metrics.sql_count, metrics.sql_time * 1000,
+        metrics.serializer_time * 1000, metrics.render_time * 1000,
+        ' '.join(f'{k}={v}' for k, v in extra.items()),
+        worst_time * 1000, worst_sql[:1000],
+    )
+
+
+def instrumented(handler):
+    '''
+    For consumers. Coroutines get their wall time recorded, plain
+    functions (the ones wrapped in database_sync_to_async) their sql too
+    '''
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    observe('ws_handler_seconds', SECONDS, time.perf_counter() - started, handler=handler)
+            return wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with tracking() as metrics:
+                    return func(*args, **kwargs)
+            finally:
+                took = time.perf_counter() - started
+                observe('ws_handler_seconds', SECONDS, took, handler=handler)
+                observe('ws_sql_queries', QUERIES, metrics.sql_count, handler=handler)
+                observe('ws_sql_seconds', SECONDS, metrics.sql_time, handler=handler)
+                log_if_slow(handler, took, metrics)
+        return wrapper
+    return decorator
+
+
+def exposition():
+    ''' every histogram so far in the prometheus text format '''
+    lines = []
+    with _registry_lock:
+        items = sorted(_registry.items(), key=lambda item: (item[0][0], str(item[0][1])))
+    typed = None
+    for (metric, labels), histogram in items:
+        if metric != typed: # once per metric, ahead of all its samples
+            lines.append(f'# TYPE {metric} histogram')
+            typed = metric
+        label_str = ','.join(f'{k}="{v}"' for k, v in labels)
+        for bound, value in histogram.samples():
+            if bound == 'sum':
+                lines.append(f'{metric}_sum{{{label_str}}} {value}')
+                lines.append(f'{metric}_count{{{label_str}}} {cumulative}')
+            else:
+                cumulative = value
+                le = f'le="{bound}"'
+                lines.append(f'{metric}_bucket{{{label_str + "," if label_str else ""}{le}}} {value}')
+    return '\n'.join(lines) + '\n'
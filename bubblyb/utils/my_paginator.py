@@ -1,20 +1,34 @@
+import json
+
+from django.core import signing
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+CURSOR_SALT = 'bubblyb.pagination'
+
+
+class CursorSerializer(signing.JSONSerializer):
+    ''' str() for datetimes and the like, keeps their microseconds unlike DjangoJSONEncoder '''
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), default=str).encode('latin-1')
+
+
 def pre_paginate(get_big_qs):
     def pre_filterer(self, *args, **kwargs):
         qs = get_big_qs(self, *args, **kwargs)
-        pg_filter = {}
-        offset = self.get_offset_object(qs)
-        
-        if offset:
-            last = len(self.paginate_kwargs) - 1
-            for i, kw in enumerate(self.paginate_kwargs):
-                if kw.startswith('-'):
-                    kw = kw[1:]
-                    pg_filter[f'{kw}{"__lt" if i==last else "__lte"}'] = self._get_attr(offset, kw)
-                else:
-                    pg_filter[f'{kw}{"__gt" if i==last else "__gte"}'] = self._get_attr(offset, kw)
-
-        qs = qs.filter(**pg_filter)
-        qs = qs.order_by(*self.paginate_kwargs)
+        # the sort values ride along on every row as _pg0, _pg1..., so the
+        # cursor of the last one needs no lookups
+        qs = qs.annotate(**{
+            f'_pg{i}': F(kw.lstrip('-')) for i, kw in enumerate(self.paginate_kwargs)
+        })
+        self.nullable = [qs.query.annotations[f'_pg{i}'].output_field.null
+            for i in range(len(self.paginate_kwargs))]
+        after = self.get_cursor(qs)
+        if after is not None:
+            qs = qs.filter(self.keyset_filter(after))
+        qs = qs.order_by(*self.keyset_ordering())
         return qs
     return pre_filterer
 
@@ -22,11 +36,18 @@ def slice_big_qs(get_filtered):
     def slicer(self, *args, **kwargs):
         qs = get_filtered(self, *args, **kwargs)
         limit_qp = self.request.query_params.get("limit", '')
-        return qs[:int(limit_qp) if limit_qp.isdigit() else self.paginate_limit]
+        self.page_limit = int(limit_qp) if limit_qp.isdigit() else self.paginate_limit
+        return qs[:self.page_limit]
     return slicer
 
 
 class PaginationMixin(object):
+    '''
+    Keyset pagination on paginate_kwargs plus the pk for ties. A full
+    page comes with an X-Next-Cursor header, pass it back as ?cursor=
+    for the next one. It is signed, so it can go straight into a range
+    query. The old ?offset=<pk> still works
+    '''
     paginate_kwargs = ('-id',)
     paginate_limit = 10
     offset_prop = 'pk'
@@ -35,18 +56,80 @@ class PaginationMixin(object):
         obj_id = self.request.query_params.get("offset", None)
         if obj_id:
             try: return qs.get(**{self.offset_prop: obj_id})
-            except: pass
+            except (ObjectDoesNotExist, ValueError): pass
         return None
 
-    def _get_attr(self, *args):
-        offset = args[0]
-        if hasattr(offset, args[1]):
-            return getattr(offset, args[1])
-        attr_list = args[1].split('__')
-        for attr in attr_list:
-            # for reverse FK or M2M, use anotate
-            offset = getattr(offset, attr)
-        return offset
+    def get_cursor(self, qs):
+        ''' sort values and pk of the row to start after '''
+        cursor = self.request.query_params.get("cursor", None)
+        if cursor:
+            values = self._load_cursor(cursor)
+            if values is None:
+                raise ValidationError({"cursor": "Invalid cursor"})
+            if len(values) != len(self.paginate_kwargs) + 1:
+                raise ValidationError({"cursor": "Cursor is from another sort order"})
+            return values
+        offset = self.get_offset_object(qs)
+        if offset is not None:
+            return self.cursor_values(offset)
+        return None
+
+    @staticmethod
+    def _load_cursor(cursor):
+        try:
+            values = signing.loads(cursor, salt=CURSOR_SALT, serializer=CursorSerializer)
+        except signing.BadSignature:
+            return None
+        return values if isinstance(values, list) and values else None
+
+    def cursor_pk(self):
+        ''' pk of the row to start after, without looking it up. get_cursor validates it '''
+        cursor = self.request.query_params.get("cursor", None)
+        if cursor:
+            values = self._load_cursor(cursor)
+            return values and values[-1]
+        return self.request.query_params.get("offset", None)
+
+    def cursor_values(self, obj):
+        return [getattr(obj, f'_pg{i}') for i in range(len(self.paginate_kwargs))] + [obj.pk]
+
+    def make_cursor(self, obj):
+        return signing.dumps(self.cursor_values(obj), salt=CURSOR_SALT, serializer=CursorSerializer)
+
+    def _descending(self):
+        return self.paginate_kwargs[-1].startswith('-')
+
+    def keyset_ordering(self):
+        ordering = []
+        for i, kw in enumerate(self.paginate_kwargs):
+            # nulls last everywhere, sqlite and postgres disagree otherwise
+            nulls = {'nulls_last': True} if self.nullable[i] else {}
+            ordering.append(F(f'_pg{i}').desc(**nulls) if kw.startswith('-') else F(f'_pg{i}').asc(**nulls))
+        return ordering + ['-pk' if self._descending() else 'pk']
+
+    def keyset_filter(self, values):
+        ''' everything after `values` in keyset_ordering(), nulls last '''
+        *values, pk = values
+        q = Q(pk__lt=pk) if self._descending() else Q(pk__gt=pk)
+        for i in reversed(range(len(self.paginate_kwargs))):
+            name, value = f'_pg{i}', values[i]
+            if value is None: # only other nulls come after one
+                q = Q(**{f'{name}__isnull': True}) & q
+            else:
+                op = 'lt' if self.paginate_kwargs[i].startswith('-') else 'gt'
+                past = Q(**{f'{name}__{op}': value})
+                if self.nullable[i]:
+                    past |= Q(**{f'{name}__isnull': True})
+                q = past | (Q(**{name: value}) & q)
+        return q
+
+    def list(self, request, *args, **kwargs):
+        page = list(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        response = Response(serializer.data)
+        if page and len(page) >= self.page_limit:
+            response['X-Next-Cursor'] = self.make_cursor(page[-1])
+        return response
 
     def get_big_queryset(self):
         return self.queryset
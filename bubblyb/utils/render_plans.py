@@ -0,0 +1,92 @@
+'''
+Compiled render plans for nested serializers
+
+Building a serializer means get_fields() plus a deepcopy of every
+declared field, and the dynamic field mixins do it again in __init__.
+Nested getters did that once per row. A plan is the list of readable
+fields of a (serializer class, dynamic fields, logged in) combination,
+worked out once per process. Method fields are called on a bare "shell"
+instance that is made once per context, so getters still see
+self.context and can set self.to_flatten like before.
+'''
+from collections import OrderedDict
+
+from rest_framework.fields import SkipField, SerializerMethodField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.serializers import BaseSerializer, Serializer
+
+from .drf_serializer_mixins import (
+    DynamicFieldsMixin,
+    LoggedInExclsvFldsMixin,
+    NestedFlattenerMixin,
+)
+
+
+_plans = {}
+
+
+def _plan_key(cls, context):
+    key = [cls]
+    if issubclass(cls, DynamicFieldsMixin):
+        key.append(tuple(context.get(cls.dyna_fld_kwarg, ())))
+    if issubclass(cls, LoggedInExclsvFldsMixin):
+        request = context.get('request')
+        key.append(bool(request and not request.user.is_anonymous))
+    return tuple(key)
+
+
+def _compile(cls, context):
+    template = cls(context=context)
+    plan = [
+        (field.field_name, field.method_name if isinstance(field, SerializerMethodField) else field)
+        for field in template._readable_fields
+    ]
+    template._context = {} # plain fields outlive this request, don't keep it alive
+    return plan
+
+
+def _shell(cls, key, context):
+    ''' serializer instance with a context but without fields, for method getters '''
+    shells = context.setdefault('_render_shells', {})
+    if key not in shells:
+        shell = cls.__new__(cls)
+        BaseSerializer.__init__(shell, context=context)
+        shells[key] = shell
+    return shells[key]
+
+
+def render(cls, obj, context=None):
+    '''
+    Same output as cls(obj, context=context).data, minus rebuilding
+    the serializer for every object
+    '''
+    context = {} if context is None else context
+    if obj is None or cls.to_representation not in (
+        Serializer.to_representation, NestedFlattenerMixin.to_representation
+    ):
+        return cls(obj, context=context).data
+
+    key = _plan_key(cls, context)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = _compile(cls, context)
+
+    shell = _shell(cls, key, context)
+    shell.__dict__.pop('to_flatten', None) # getters set it per object
+    ret = OrderedDict()
+    for name, getter in plan:
+        if isinstance(getter, str):
+            ret[name] = getattr(shell, getter)(obj)
+            continue
+        try:
+            attribute = getter.get_attribute(obj)
+        except SkipField:
+            continue
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        ret[name] = None if check_for_none is None else getter.to_representation(attribute)
+
+    if issubclass(cls, NestedFlattenerMixin):
+        nested = ret.pop(shell.to_flatten, [])
+        for k in nested:
+            ret[k] = nested[k]
+    return ret
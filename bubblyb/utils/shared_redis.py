@@ -0,0 +1,14 @@
+'''
+The redis behind the default cache, for features that need more than
+get and set (sorted sets, pipelines, scripts)
+'''
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+# redis is down, or the cache is not django_redis at all (tests, local
+# dev). whatever is built on it should degrade instead of failing
+UNAVAILABLE = (RedisError, NotImplementedError)
+
+
+def get_redis():
+    return get_redis_connection('default')
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.core.cache import cache
+
+
+class TwoTierCache(object):
+    '''
+    In process LRU with a TTL in front of the shared (redis) cache.
+    delete() only clears this process' local tier, other processes
+    notice once their copy expires, so keep local_ttl short
+    '''
+    def __init__(self, prefix, maxsize=1024, local_ttl=30, shared_ttl=60*60):
+        self.prefix = prefix
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self._local = OrderedDict()
+        self._lock = Lock()
+
+    def _key(self, key):
+        return f'{self.prefix}_{key}'
+
+    def get(self, key, loader):
+        ''' loader() is called on a miss in both tiers. None is never cached '''
+        key = self._key(key)
+        with self._lock:
+            hit = self._local.get(key)
+            if hit and hit[0] > time.monotonic():
+                self._local.move_to_end(key)
+                return hit[1]
+
+        value = cache.get(key)
+        if value is None:
+            value = loader()
+            if value is None:
+                return None
+            cache.set(key, value, self.shared_ttl)
+
+        self._remember({key: value})
+        return value
+
+    def get_many(self, keys, loader):
+        ''' loader(missing_keys) returns {key: value} for whatever it found '''
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                hit = self._local.get(self._key(key))
+                if hit and hit[0] > now:
+                    found[key] = hit[1]
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = cache.get_many([self._key(key) for key in missing])
+            for key in missing:
+                if self._key(key) in shared:
+                    found[key] = shared[self._key(key)]
+            still_missing = [key for key in missing if key not in found]
+            loaded = loader(still_missing) if still_missing else {}
+            if loaded:
+                cache.set_many({self._key(key): value for key, value in loaded.items()}, self.shared_ttl)
+                found.update(loaded)
+            self._remember({self._key(key): found[key] for key in missing if key in found})
+        return found
+
+    def _remember(self, items):
+        expires = time.monotonic() + self.local_ttl
+        with self._lock:
+            for key, value in items.items():
+                self._local[key] = (expires, value)
+                self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def delete(self, *keys):
+        keys = [self._key(key) for key in keys]
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        cache.delete_many(keys)
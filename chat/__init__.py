@@ -1 +1 @@
-# default_app_config = 'chat.apps.ChatConfig'
\ No newline at end of file
+default_app_config = 'chat.apps.ChatConfig'
@@ -3,5 +3,6 @@ from django.apps import AppConfig
 
 class ChatConfig(AppConfig):
     name = 'chat'
+
     def ready(self):
-        import chat.signals
\ No newline at end of file
+        import chat.signals #noqa
@@ -1,60 +1,120 @@
+import asyncio
 import json
+import time
+from asgiref.sync import sync_to_async
 from channels.consumer import AsyncConsumer
 from channels.db import database_sync_to_async
 import channels.exceptions as excpt
 
-from .models import Room, Message
-from reacts.models import Icon
+from bubblyb.utils import instrumented, render
+
+from .models import Room, Roommate, Message
+from reacts import icon_cache
 from communities.models import Membership
+from accounts.presence import get_heartbeat
 
-from .serializers import MessageSerializer
+from . import publisher, typists
+from .writer import get_writer
+from .watchers import get_watchers
 from accounts.serializers import UserPeakSerializer
 
 
 class ChatConsumer(AsyncConsumer):
+    '''
+    Everything that needs the db runs in database_sync_to_async. What the
+    user may do in the room and how they look in it is worked out once at
+    connect, and again only when a "room.state" event says it changed.
+    '''
+    @instrumented('chat.connect')
     async def websocket_connect(self, event):
         print("Whenever problem arises, be sure to check Redis first")
         self.me = self.scope['user']
         self.thread_obj = await self.get_room(self.scope['url_route']['kwargs']['thread_id'])
         self.t_name = self.thread_obj.channels_layer_name
+        self.last_ping = float('-inf')
+        self.online = False
 
-        if self.thread_obj.has_room_perm(self.me, basic_perms=True):
+        await self.load_state()
+        if self.allowed:
             await self.channel_layer.group_add(self.t_name, self.channel_name)
             await self.send({
                 "type": "websocket.accept",
             })
-          
+            self.online = True
+            await get_heartbeat().join(self.me.pk)
+            await get_watchers().join(self.thread_obj.id, self.me.pk)
+
+    async def room_state(self, event):
+        if event["user"] not in (None, self.me.pk):
+            return
+        await self.load_state()
+        if not self.allowed:
+            if self.online:
+                self.online = False
+                await get_heartbeat().leave(self.me.pk)
+                await get_watchers().leave(self.thread_obj.id, self.me.pk)
+            await self.channel_layer.group_discard(self.t_name, self.channel_name)
+            await self.send({
+                "type": "websocket.close",
+            })
+
+    @instrumented('chat.receive')
     async def websocket_receive(self, event):
         received = event.get("text")
         if received == "tpng":
-            # Someone is typing
-            response = {
-                "type": "tpng",
-                "user": UserPeakSerializer(
-                    self.me, context={'profile_flds': ('profile_pic',)}
-                ).data,
-            }
-            await self.channel_layer.group_send(self.t_name, {
-                "type": "chat_message",
-                "text": json.dumps(response)
-            })
+            await self.typing()
         elif received is not None:
             loaded_dict = json.loads(received)
-            new_msg_obj = await self.save_chat_msg(loaded_dict)
-            response = {
-                # "type": "msg",
-                "nonce": loaded_dict["nonce"],
-                "msg_data": MessageSerializer(
-                    new_msg_obj,
-                    context = {'profile_flds': ('profile_pic', 'fave_color')}
-                ).data,
-            }
-            await self.channel_layer.group_send(self.t_name, {
+            msg = await self.build_chat_msg(loaded_dict)
+            # the writer batches the insert and publishes to everyone else,
+            # sender gets its nonce back on its own channel
+            data = await get_writer().write(msg, self.authors, self.channel_name)
+            await self.send({
+                "type": "websocket.send",
+                "text": publisher.ack(data, loaded_dict["nonce"]),
+            })
+
+    async def typing(self):
+        now = time.monotonic()
+        if now - self.last_ping < typists.PING_INTERVAL:
+            return
+        self.last_ping = now
+        try:
+            flush = await sync_to_async(typists.ping, thread_sensitive=False)(
+                self.thread_obj.id, self.me.pk, self.typing_user
+            )
+        except typists.UNAVAILABLE:
+            return await self.channel_layer.group_send(self.t_name, {
                 "type": "chat_message",
-                "text": json.dumps(response)
+                "text": typists.frame(self.typing_user),
+            })
+        if flush:
+            asyncio.ensure_future(self.flush_typing())
+
+    async def flush_typing(self):
+        # trailing edge, so everyone who pinged during the interval is in
+        await asyncio.sleep(typists.FLUSH_INTERVAL)
+        try:
+            users = await sync_to_async(typists.current, thread_sensitive=False)(self.thread_obj.id)
+        except typists.UNAVAILABLE:
+            return
+        if users:
+            await self.channel_layer.group_send(self.t_name, {
+                "type": "chat_typing",
+                "users": users,
+            })
+
+    async def chat_typing(self, event):
+        # one frame per typist, what clients understood before the coalescing
+        for user in event["users"]:
+            await self.send({
+                "type": "websocket.send",
+                "text": typists.frame(user),
             })
 
     async def chat_message(self, event):
+        if event.get("exclude") == self.channel_name:
+            return
         await self.send({
             "type": "websocket.send",
             "text": event["text"]
@@ -62,6 +122,10 @@ class ChatConsumer(AsyncConsumer):
         
     async def websocket_disconnect(self, event):
         print("---------------disconnected", event)
+        if getattr(self, 'online', False): # may not have got through connect
+            self.online = False
+            await get_heartbeat().leave(self.me.pk)
+            await get_watchers().leave(self.thread_obj.id, self.me.pk)
 
     # async def respondWithErr(self):
     #     await self.channel_layer.group_send(self.t_name, {
@@ -73,26 +137,48 @@ class ChatConsumer(AsyncConsumer):
     #     })
 
     @database_sync_to_async
+    @instrumented('chat.get_room')
     def get_room(self, id):
         try:
-            return Room.objects.get(id = id)
+            return Room.objects.select_related('publicroom').get(id = id)
         except:
             raise excpt.DenyConnection
 
     @database_sync_to_async
-    def save_chat_msg(self, received):
+    @instrumented('chat.load_state')
+    def load_state(self):
+        self.me.__dict__.pop('_cmty_roles', None) # memoized by Membership.get_role
+        self.emote_perms = {}
+        self.allowed = False
+        if self.me.is_anonymous:
+            return
+        if Roommate.objects.filter(room = self.thread_obj, identity = self.me).exists():
+            self.allowed = True
+        elif hasattr(self.thread_obj, 'publicroom'):
+            self.allowed = Membership.check_member(self.thread_obj.publicroom.associated_with_id, self.me)
+
+        self.authors = {self.me.pk: publisher.author(self.me)}
+        self.typing_user = json.dumps(
+            render(UserPeakSerializer, self.me, {'profile_flds': ('profile_pic',)})
+        )
+
+    @database_sync_to_async
+    @instrumented('chat.build_chat_msg')
+    def build_chat_msg(self, received):
         msg_content = received["c__content"]
         msg_type = received["c__msg_type"]
         if msg_type == 11:
-            try:
-                emote = Icon.objects.get(id = msg_content)
-            except Icon.DoesNotExist:
+            emote = icon_cache.get_icon(msg_content)
+            if emote is None:
                 raise excpt.RequestAborted
-            if not Membership.check_member(emote.belongs_to, self.me):
+            # only asked once per community for the whole connection
+            if emote.belongs_to_id not in self.emote_perms:
+                self.emote_perms[emote.belongs_to_id] = Membership.check_member(emote.belongs_to_id, self.me)
+            if not self.emote_perms[emote.belongs_to_id]:
                 raise excpt.RequestAborted
             msg_content = emote.img_src
 
-        return Message.objects.create(
+        return Message(
             thread = self.thread_obj,
             author = self.me,
             content = msg_content,
@@ -28,10 +28,20 @@ class Room(models.Model):
     bg_img = models.CharField(max_length=255, null=True, blank=True)
     # END OF CUSTOMIZING
 
+    # denormalized, kept up by chat/signals.py (reconcile_counters fixes drift)
+    last_message = models.ForeignKey('Message', null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    member_count = models.PositiveIntegerField(default=0)
+
     objects = RoomManager()
     @property
     def channels_layer_name(self):
-        return f"thread_{self.id}"
+        return self.group_name(self.id)
+
+    @staticmethod
+    def group_name(room_id):
+        return f"thread_{room_id}"
 
     def has_room_perm(self, user, basic_perms=False):
         if not user.is_anonymous:
@@ -100,6 +110,7 @@ class Roommate(models.Model):
     is_admin = models.BooleanField(default=False)
     enable_noti = models.BooleanField(default=True)
     last_seen = models.DateTimeField(auto_now_add=True)
+    unread_count = models.PositiveIntegerField(default=0) # messages by others since last_seen
     class Meta:
         unique_together = ('room', 'identity')
 
@@ -127,6 +138,14 @@ class Message(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     msg_type = models.SmallIntegerField(choices=MESSAGE_TYPES, default=1)
     content = models.TextField()
+
+    # saved by chat.writer, receivers get it with the rest of its batch
+    # from chat.signals.messages_created instead of post_save
+    batched = False
     
     class Meta:
-        ordering = ('-timestamp',)
\ No newline at end of file
+        ordering = ('-timestamp',)
+        indexes = [
+            # history pages of a room, see chat/pagination.py
+            models.Index(fields=['thread', '-timestamp', '-id'], name='chat_msg_history_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,82 @@
+'''
+Keyset pagination for message history
+
+Pages are anchored on (timestamp, id), handed to the client as an opaque
+cursor, so nothing is skipped when messages share a timestamp and there
+is no lookup query for the anchor. ?before=<cursor> scrolls back,
+?after=<cursor> loads what came in since (after a reconnect). Either way
+messages come newest first, like before. The cursors of both ends of a
+page and whether there is more in the asked direction are in headers.
+'''
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+def encode_cursor(msg):
+    raw = f'{msg.timestamp.isoformat()}|{msg.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, msg_id = raw.split('|')
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None:
+            raise ValueError
+        return timestamp, int(msg_id)
+    except ValueError: # bad base64/utf8 are ValueErrors too
+        raise ValidationError("Bad cursor")
+
+
+class MessageCursorPagination(BasePagination):
+    limit = 20
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        limit = params.get('limit', '')
+        limit = min(int(limit), self.max_limit) if limit.isdigit() else self.limit
+
+        self.newer = 'after' in params
+        if self.newer:
+            timestamp, msg_id = decode_cursor(params['after'])
+            queryset = queryset.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=msg_id)
+            ).order_by('timestamp', 'id')
+        else:
+            anchor = self.get_anchor(queryset, params)
+            if anchor is not None:
+                timestamp, msg_id = anchor
+                queryset = queryset.filter(
+                    Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=msg_id)
+                )
+            queryset = queryset.order_by('-timestamp', '-id')
+
+        page = list(queryset[:limit + 1])
+        self.has_more = len(page) > limit
+        page = page[:limit]
+        if self.newer:
+            page.reverse()
+        self.page = page
+        return page
+
+    def get_anchor(self, queryset, params):
+        if 'before' in params:
+            return decode_cursor(params['before'])
+        # old clients still send the id of the last message they have
+        offset = params.get('offset', '')
+        if offset.isdigit():
+            return queryset.filter(pk=offset).values_list('timestamp', 'id').first()
+        return None
+
+    def get_paginated_response(self, data):
+        headers = {'X-Has-More': 'true' if self.has_more else 'false'}
+        if self.page:
+            headers['X-After-Cursor'] = encode_cursor(self.page[0])
+            headers['X-Before-Cursor'] = encode_cursor(self.page[-1])
+        return Response(data, headers=headers)
@@ -0,0 +1,64 @@
+'''
+The one way a new Message gets to the sockets of its room
+
+A message is serialized once and goes through the channel layer once.
+Consumers leave their own channel out of the group send and answer the
+sender directly with the same payload plus its nonce, REST views making
+system messages just publish().
+
+state_changed() tells the consumers of a room that a user's membership
+changed, they keep it cached for the whole connection otherwise.
+'''
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Room
+
+MSG_CONTEXT = {'profile_flds': ('profile_pic', 'fave_color')}
+
+
+def payload(msg_obj, authors=None):
+    ''' authors: {username: author()} already rendered, the consumer keeps its own '''
+    from .serializers import MessageSerializer # serializers publish too
+    context = dict(MSG_CONTEXT, authors=authors or {})
+    return {
+        "msg_data": MessageSerializer(msg_obj, context=context).data,
+    }
+
+
+def author(user):
+    from .serializers import MessageSerializer
+    return MessageSerializer.render_author(user, dict(MSG_CONTEXT))
+
+
+def group_event(data, exclude=None):
+    ''' what goes to group_send, ChatConsumer.chat_message skips `exclude` '''
+    event = {
+        "type": "chat_message",
+        "text": json.dumps(data),
+    }
+    if exclude is not None:
+        event["exclude"] = exclude
+    return event
+
+
+def ack(data, nonce):
+    ''' the sender's copy, tells it which of its pending messages this was '''
+    return json.dumps({"nonce": nonce, **data})
+
+
+def publish(msg_obj):
+    async_to_sync(get_channel_layer().group_send)(
+        msg_obj.thread.channels_layer_name,
+        group_event(payload(msg_obj)),
+    )
+
+
+def state_changed(room_id, username=None):
+    ''' None reloads everyone in the room '''
+    async_to_sync(get_channel_layer().group_send)(
+        Room.group_name(room_id),
+        {"type": "room.state", "user": username},
+    )
@@ -8,28 +8,12 @@ from communities.models import Community
 from accounts.serializers import UserPeakSerializer
 from communities.serializers import CommunityPeakSerializer
 
-from bubblyb.utils import NestedFlattenerMixin
+from bubblyb.utils import NestedFlattenerMixin, PrimedListSerializer, render
 
 
 from django.db.models import Max
 
-import json
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-def signal_to_consumer(msg_obj):
-    response = {
-        "msg_data": MessageSerializer(
-            msg_obj,
-            context = {'profile_flds': ('profile_pic', 'fave_color')}
-        ).data,
-    }
-    async_to_sync(get_channel_layer().group_send)(
-        msg_obj.thread.channels_layer_name,
-        {
-            "type": "chat_message",
-            "text": json.dumps(response)
-        }
-    )
+from . import publisher
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -44,7 +28,14 @@ class MessageSerializer(serializers.ModelSerializer):
             'content',
         )
     def get_author(self, obj):
-        return UserPeakSerializer(obj.author, context=self.context).data
+        authors = self.context.get('authors', {})
+        if obj.author_id in authors:
+            return authors[obj.author_id]
+        return self.render_author(obj.author, self.context)
+
+    @staticmethod
+    def render_author(user, context):
+        return render(UserPeakSerializer, user, context)
 
 
 
@@ -66,7 +57,7 @@ class RoomDetailSerializer(NestedFlattenerMixin, serializers.ModelSerializer):
     def get_roommate_info(self, obj):
         try:
             for info in obj.my_info:
-                return MyRoommateInfoSerializer(info).data
+                return render(MyRoommateInfoSerializer, info)
         except AttributeError:
             print("my roommate info NO PREFETCH")
             try:
@@ -86,23 +77,18 @@ class RoomDetailSerializer(NestedFlattenerMixin, serializers.ModelSerializer):
             roomType = "direct"
             dr = obj.direct
             other_u = dr.u2 if dr.u1 == self.context['request'].user else dr.u1
-            data = UserPeakSerializer(other_u, context=self.context).data
+            data = render(UserPeakSerializer, other_u, self.context)
 
         elif hasattr(obj, 'publicroom'):
             roomType = "public"
             data = {
-                'community': CommunityPeakSerializer(obj.publicroom.associated_with).data,
+                'community': render(CommunityPeakSerializer, obj.publicroom.associated_with),
                 'order': obj.publicroom.order
             }
 
         else:
             roomType = "group"
-            try:
-                count = obj.roommate__count
-            except AttributeError:
-                print("rommate count NO PREFETCH")
-                count = obj.roommate_set.count()
-            data = {"roommate_count" : count}
+            data = {"roommate_count" : obj.member_count}
 
         return {
             "room_type" : roomType,
@@ -110,7 +96,7 @@ class RoomDetailSerializer(NestedFlattenerMixin, serializers.ModelSerializer):
         }
 
     def validate_name(self, value):
-        signal_to_consumer( # wierd flex but ok
+        publisher.publish( # wierd flex but ok
             Message.objects.create(
                 thread = self.instance,
                 author = self.context['request'].user,
@@ -120,7 +106,7 @@ class RoomDetailSerializer(NestedFlattenerMixin, serializers.ModelSerializer):
         )
         return value
     def validate_bg_img(self, value):
-        signal_to_consumer(Message.objects.create(
+        publisher.publish(Message.objects.create(
             thread = self.instance,
             author = self.context['request'].user,
             msg_type = 7,
@@ -136,10 +122,12 @@ class MyRoommateInfoSerializer(serializers.ModelSerializer):
             'is_admin',
             'enable_noti',
             'last_seen',
+            'unread_count',
         )
         read_only_fields = (
             'is_admin',
             'last_seen',
+            'unread_count',
         )
         
 
@@ -153,12 +141,18 @@ class RoommateListSerializer(NestedFlattenerMixin, serializers.ModelSerializer):
                 self.fields.pop('identity')
             else:
                 self.fields['identity'] = UserPeakSerializer(context=context)
+
+    def prime(self, mates):
+        if 'identity' in self.fields:
+            self.fields['identity'].prime([mate.identity for mate in mates])
+
     class Meta:
         model = Roommate
         fields = (
             'identity',
             'is_admin',
         )
+        list_serializer_class = PrimedListSerializer
 
 
 class RoomCreateSerializer(serializers.Serializer):
@@ -196,7 +190,7 @@ class RoomCreateSerializer(serializers.Serializer):
                     _, created = Roommate.objects.get_or_create(room=room, **buddy)
                     if created: new +=1
         if new:
-            signal_to_consumer(Message.objects.create(
+            publisher.publish(Message.objects.create(
                 thread = room,
                 author = you,
                 msg_type = 5,
@@ -228,8 +222,7 @@ class RoomListSerializer(RoomDetailSerializer):
             'meta_data',
         )
     def get_last_msg(self, obj):
-        return PeakMessageSerializer(
-            obj.message_set.first() ).data
+        return render(PeakMessageSerializer, obj.last_message)
 
 
 
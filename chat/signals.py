@@ -1,28 +1,91 @@
-import json
-import asyncio
-
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-
-from .models import Message
-from .serializers import MessageSerializer
-
-
-@receiver(post_save, sender=Message, weak=True, dispatch_uid=None)
-def new_message(sender, instance, **kwargs):
-    response = {
-        "msg_data": MessageSerializer(
-            instance,
-            context = {'profile_flds': ('profile_pic', 'fave_color')}
-        ).data,
-    }
-    async_to_sync(get_channel_layer().group_send)(
-        instance.thread.channels_layer_name,
-        {
-            "type": "chat_message",
-            "text": json.dumps(response)
-        }
-    )
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from communities.models import Membership
+from .models import Room, Roommate, PublicRoom, Message
+from . import publisher, watchers
+
+# chat.writer stores messages in batches and sends this once per batch
+# instead of a post_save for every message
+messages_created = Signal(providing_args=['messages'])
+
+
+@receiver(post_save, sender=Message)
+def message_added(sender, instance, created, **kwargs):
+    if created and not instance.batched:
+        messages_added(sender, [instance])
+
+@receiver(messages_created, sender=Message)
+def messages_added(sender, messages, **kwargs):
+    # one update of the room and one of its roommates per room, however many messages
+    by_room = {}
+    for msg in messages:
+        by_room.setdefault(msg.thread_id, []).append(msg)
+    for room_id, msgs in by_room.items():
+        last = max(msgs, key=lambda msg: (msg.timestamp, msg.pk))
+        Room.objects.filter(
+            Q(last_message_at__isnull=True) | Q(last_message_at__lte=last.timestamp),
+            pk = room_id,
+        ).update(last_message=last, last_message_at=last.timestamp)
+
+        # everyone gets all of them as unread but the ones they wrote
+        written = Counter(msg.author_id for msg in msgs)
+        roommates = Roommate.objects.filter(room_id=room_id)
+        if len(written) == 1:
+            roommates.exclude(identity_id=last.author_id) \
+                .update(unread_count=F('unread_count') + len(msgs))
+        else:
+            roommates.update(unread_count=F('unread_count') + Case(
+                *[When(identity_id=author, then=Value(len(msgs) - count))
+                    for author, count in written.items()],
+                default = Value(len(msgs)),
+                output_field = IntegerField(),
+            ))
+
+
+@receiver(post_save, sender=Roommate)
+def roommate_added(sender, instance, created, **kwargs):
+    if created:
+        Room.objects.filter(pk=instance.room_id).update(member_count=F('member_count') + 1)
+
+@receiver(post_delete, sender=Roommate)
+def roommate_removed(sender, instance, **kwargs):
+    Room.objects.filter(pk=instance.room_id, member_count__gt=0) \
+        .update(member_count=F('member_count') - 1)
+
+
+@receiver([post_save, post_delete], sender=Roommate)
+def push_recipients_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'enable_noti' in update_fields:
+        watchers.forget_recipients(instance.room_id)
+
+
+@receiver([post_save, post_delete], sender=Roommate)
+def roommate_changed(sender, instance, created=True, **kwargs):
+    # joined or left (post_delete has no created), connected sockets of that
+    # user reload whether they may stay. other edits don't change that
+    if created:
+        transaction.on_commit(lambda: publisher.state_changed(instance.room_id, instance.identity_id))
+
+
+def _public_rooms_changed(ship):
+    def send():
+        rooms = PublicRoom.objects.filter(associated_with_id=ship.community_id)
+        for room_id in rooms.values_list('room_id', flat=True):
+            publisher.state_changed(room_id, ship.user_id)
+    transaction.on_commit(send)
+
+@receiver(post_save, sender=Membership)
+def membership_saved(sender, instance, **kwargs):
+    # public rooms are open to members of their community, a ban closes them.
+    # reputation points and the like don't matter to them
+    if instance.role_changed():
+        _public_rooms_changed(instance)
+
+@receiver(post_delete, sender=Membership)
+def membership_deleted(sender, instance, **kwargs):
+    _public_rooms_changed(instance)
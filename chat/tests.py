@@ -1,3 +1,58 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import User
+from .models import Room, Roommate, Message
+from .signals import messages_created
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a, cls.b, cls.c = [User.objects.create_user(username=name, email=f'{name}@a.a', password='x')
+            for name in ('a', 'b', 'c')]
+        cls.room = Room.objects.create_room(cls.a)
+        for user in (cls.b, cls.c):
+            Roommate.objects.create(room=cls.room, identity=user)
+        Roommate.objects.update(unread_count=0) # the "made the room" message
+
+    def unread(self, room=None):
+        return dict(Roommate.objects.filter(room=room or self.room).values_list('identity', 'unread_count'))
+
+    def message(self, author, room=None, **kwargs):
+        return Message(thread=room or self.room, author=author, content='hi', **kwargs)
+
+    def test_member_count(self):
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.member_count, 3)
+        Roommate.objects.get(room=self.room, identity=self.c).delete()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.member_count, 2)
+
+    def test_message_counts_as_unread_for_the_others(self):
+        msg = self.message(self.a)
+        msg.save()
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.last_message, self.room.last_message_at), (msg, msg.timestamp))
+        self.assertEqual(self.unread(), {'a': 0, 'b': 1, 'c': 1})
+
+    def test_batch_is_one_update_per_room(self):
+        other = Room.objects.create_room(self.b)
+        Roommate.objects.update(unread_count=0)
+        msgs = [self.message(self.a), self.message(self.b), self.message(self.a), self.message(self.b, other)]
+        for msg in msgs:
+            msg.batched = True
+            msg.save()
+        with self.assertNumQueries(4): # room and roommates, for each room
+            messages_created.send(sender=Message, messages=msgs)
+        self.assertEqual(self.unread(), {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(self.unread(other), {'b': 0})
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message, msgs[2])
+
+    def test_seen_resets_unread(self):
+        self.message(self.a).save()
+        client = APIClient()
+        client.force_authenticate(self.b)
+        self.assertEqual(client.put(f'/chat/{self.room.pk}/roommates/__self').status_code, 200)
+        self.assertEqual(self.unread(), {'a': 0, 'b': 0, 'c': 1})
@@ -0,0 +1,70 @@
+'''
+Who is typing, one group send per room instead of one per keystroke
+
+Typists sit in a redis sorted set per room, keyed by username and scored
+by when they stop counting as typing, so nobody has to clean up after
+them and a typist is only in once however they render. How they render
+is kept next to it in a hash. The first ping of a room in a
+FLUSH_INTERVAL takes a short lock and that consumer sends the whole list
+to the room once the interval is over, whichever worker it lives on.
+Sockets pinging faster than PING_INTERVAL are dropped before they ever
+reach redis.
+
+Clients still get the frames they always did, {"type": "tpng", "user":
+{...}}, one per typist. Only the group send carries the list.
+'''
+import time
+
+from bubblyb.utils.shared_redis import get_redis, UNAVAILABLE # callers send the single typist then
+
+TYPING_TTL = 4     # seconds a ping keeps someone in the list
+PING_INTERVAL = 1  # faster pings from one socket are ignored
+FLUSH_INTERVAL = 1 # at most one group send per room this often
+
+# drops expired typists from both keys, returns the rendered live ones
+_CURRENT_SCRIPT = '''
+local stale = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1])
+if #stale > 0 then
+    redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+    redis.call('hdel', KEYS[2], unpack(stale))
+end
+local live = redis.call('zrange', KEYS[1], 0, -1)
+if #live == 0 then
+    return {}
+end
+return redis.call('hmget', KEYS[2], unpack(live))
+'''
+
+
+def _key(room_id):
+    return 'typing_%s' % room_id
+
+def _users_key(room_id):
+    return 'typing_users_%s' % room_id
+
+def _lock_key(room_id):
+    return 'typing_lock_%s' % room_id
+
+
+def ping(room_id, username, user_json):
+    ''' user_json is the typist's rendered user. True if the caller should flush the room '''
+    key, users_key = _key(room_id), _users_key(room_id)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zadd(key, {username: time.time() + TYPING_TTL})
+    pipe.hset(users_key, username, user_json)
+    pipe.expire(key, TYPING_TTL)
+    pipe.expire(users_key, TYPING_TTL)
+    pipe.set(_lock_key(room_id), 1, nx=True, px=int(FLUSH_INTERVAL * 1000))
+    return bool(pipe.execute()[-1])
+
+
+def current(room_id):
+    ''' rendered users still typing '''
+    current = get_redis().register_script(_CURRENT_SCRIPT)
+    users = current(keys=[_key(room_id), _users_key(room_id)], args=[time.time()])
+    return [user.decode() for user in users if user is not None]
+
+
+def frame(user):
+    # user is json already, no point decoding it to encode it again
+    return '{"type": "tpng", "user": %s}' % user
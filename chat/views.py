@@ -8,16 +8,17 @@ from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from django.db.models import Prefetch, Count, Max
+from django.db.models import Prefetch, Max
 from django.utils.timezone import now
 
 from .models import Message, Room, Roommate, PublicRoom
 from communities.models import Membership
 from accounts.models import User
 
-from . import serializers
+from . import serializers, publisher
 
 from .permissions import IsAdminOrBasicPerms
+from .pagination import MessageCursorPagination
 
 from bubblyb.utils import PaginationMixin, count_db_hits
 
@@ -32,18 +33,17 @@ class GetRoomMixin(object):
         return obj
 
 
-class RetrieveMessagesAPIView(GetRoomMixin, PaginationMixin, generics.ListAPIView):
+class RetrieveMessagesAPIView(GetRoomMixin, generics.ListAPIView):
     serializer_class = serializers.MessageSerializer
     permission_classes = (IsAdminOrBasicPerms,)
-    paginate_kwargs = ('-timestamp',)
-    paginate_limit = 20
+    pagination_class = MessageCursorPagination
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['profile_flds'] = ('profile_pic', 'fave_color')
         return context
 
-    def get_big_queryset(self):
+    def get_queryset(self):
         qs = Message.objects.all()
         qs = qs.filter(thread = self.get_room_object())
         qs = qs.select_related('author')
@@ -74,7 +74,7 @@ class RoommateListAPIView(GetRoomMixin, PaginationMixin, generics.ListAPIView):
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context['profile_flds'] = ('profile_pic', 'fave_color')
+        context['profile_flds'] = ('profile_pic', 'fave_color', 'online')
         return context
     
     def get_big_queryset(self):
@@ -108,7 +108,7 @@ class RoommateEditAPIView(GetRoomMixin, generics.UpdateAPIView):
         if hasattr(mate_obj.room, 'direct'):
             raise APIException("Not here", status.HTTP_406_NOT_ACCEPTABLE)
         mate_obj.delete()
-        serializers.signal_to_consumer(
+        publisher.publish(
             Message.objects.create(
             thread = mate_obj.room,
             author = request.user,
@@ -167,7 +167,8 @@ class MyRoommateInfoAPIView(GetRoomMixin, mixins.UpdateModelMixin, generics.Retr
     def put(self, request, **kwargs):
         me = self.get_object()
         me.last_seen = now()
-        me.save()
+        me.unread_count = 0
+        me.save(update_fields=['last_seen', 'unread_count'])
         return Response(status = status.HTTP_200_OK)
 
     def delete(self, request, *args, **kwargs):
@@ -186,7 +187,7 @@ class MyRoommateInfoAPIView(GetRoomMixin, mixins.UpdateModelMixin, generics.Retr
                     admins = mates.filter(is_admin=True)
                     if not admins.exists():  # auto assign oldest member as new admin
                         mates.earliest('timestamp').is_admin = True
-            serializers.signal_to_consumer(
+            publisher.publish(
                 Message.objects.create(
                 thread = room,
                 author = request.user,
@@ -200,7 +201,7 @@ class MyRoommateInfoAPIView(GetRoomMixin, mixins.UpdateModelMixin, generics.Retr
 class MyRoomListAPIView(PaginationMixin, generics.ListAPIView): 
     serializer_class = serializers.RoomListSerializer
     permission_classes = (IsAuthenticated,)
-    paginate_kwargs = ('-message__timestamp',)
+    paginate_kwargs = ('-last_message_at',)
     paginate_limit = 15
     
     # @count_db_hits
@@ -212,20 +213,14 @@ class MyRoomListAPIView(PaginationMixin, generics.ListAPIView):
     def get_big_queryset(self):
         user = self.request.user
         qs = Room.objects.filter(roommate__identity = user)
-        qs = qs.select_related('publicroom__associated_with', 'direct__u1', 'direct__u2')
+        qs = qs.select_related('last_message', 'publicroom__associated_with', 'direct__u1', 'direct__u2')
         qs = qs.prefetch_related(
-            Prefetch('message_set',
-                queryset=Message.objects.order_by('-timestamp')),
             Prefetch(
                 'roommate_set',
                 queryset=Roommate.objects.filter(identity = user),
                 to_attr="my_info"
             )
         )
-        qs = qs.annotate(
-            Count('roommate'),
-            message__timestamp = Max('message__timestamp')
-        )
         return qs
 
 class PublicRoomExplorerAPIView(PaginationMixin, generics.ListAPIView):
@@ -247,15 +242,8 @@ class PublicRoomExplorerAPIView(PaginationMixin, generics.ListAPIView):
         qs = qs.prefetch_related(
             Prefetch(
                 'publicroom_set',
-                queryset = PublicRoom.objects.select_related('room') \
-                .prefetch_related(
-                    Prefetch(
-                        'room__message_set',
-                        queryset=Message.objects.order_by('-timestamp')
-                    )
-                ).annotate(
-                    room__message__timestamp = Max('room__message__timestamp')
-                ).order_by('-room__message__timestamp'),
+                queryset = PublicRoom.objects.select_related('room__last_message') \
+                    .order_by('-room__last_message_at'),
                 # to_attr = 'publicroom_set'
             )
         )
@@ -0,0 +1,93 @@
+'''
+Who has a room open, and who of the rest gets pushes for it
+
+A socket connected to a room puts its user in the room's `watchers`
+sorted set, scored by expiry, and the Watchers of its worker keeps the
+scores fresh every HEARTBEAT seconds with one pipeline. Pushes for new
+messages skip whoever is watching. A user watching the same room from
+two workers who closes one of them may get one push too many until the
+other worker's next beat, which is fine.
+
+The roommates with notifications on are cached per room, the chat
+signals forget them when a roommate changes.
+'''
+import time
+
+from django.core.cache import cache
+
+from bubblyb.utils.heartbeat import LoopHeartbeat
+from bubblyb.utils.shared_redis import get_redis, UNAVAILABLE
+from .models import Roommate
+
+HEARTBEAT = 20
+WATCH_TTL = HEARTBEAT * 3
+RECIPIENTS_TTL = 60 * 60
+
+
+def _key(room_id):
+    return 'watchers_%s' % room_id
+
+def _recipients_key(room_id):
+    return 'noti_mates_%s' % room_id
+
+
+def watch(pairs):
+    ''' pairs of (room id, username) '''
+    expiry = time.time() + WATCH_TTL
+    pipe = get_redis().pipeline(transaction=False)
+    for room_id, username in pairs:
+        pipe.zadd(_key(room_id), {username: expiry})
+        pipe.expire(_key(room_id), WATCH_TTL)
+    pipe.execute()
+
+
+def unwatch(room_id, username):
+    get_redis().zrem(_key(room_id), username)
+
+
+def watching(room_id):
+    try:
+        return {user.decode() for user in get_redis().zrangebyscore(_key(room_id), time.time(), '+inf')}
+    except UNAVAILABLE:
+        return set()
+
+
+def recipients(room_id):
+    ''' usernames of the roommates with notifications on '''
+    key = _recipients_key(room_id)
+    usernames = cache.get(key)
+    if usernames is None:
+        usernames = list(Roommate.objects.filter(room_id=room_id, enable_noti=True) \
+            .values_list('identity', flat=True))
+        cache.set(key, usernames, RECIPIENTS_TTL)
+    return usernames
+
+def forget_recipients(room_id):
+    cache.delete(_recipients_key(room_id))
+
+
+def push_recipients(room_id, author):
+    watchers = watching(room_id)
+    return [username for username in recipients(room_id)
+        if username != author and username not in watchers]
+
+
+class Watchers(LoopHeartbeat):
+    ''' the (room, user) pairs this worker holds sockets of. everyone gets pushes without redis, like before '''
+    interval = HEARTBEAT
+
+    async def join(self, room_id, username):
+        await super().join((room_id, username))
+    async def leave(self, room_id, username):
+        await super().leave((room_id, username))
+
+    def start(self, pair):
+        watch([pair])
+    def stop(self, pair):
+        unwatch(*pair)
+    def beat(self, pairs):
+        watch(pairs)
+
+
+def get_watchers():
+    return Watchers.for_loop()
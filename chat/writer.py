@@ -0,0 +1,96 @@
+'''
+Write-behind for chat messages
+
+Consumers don't insert their messages themselves, they hand them to the
+MessageWriter of their worker and await it. The writer waits FLUSH_DELAY
+for a burst to pile up, stores up to MAX_BATCH messages with one
+bulk_create and then publishes them in the order they came in, so a room
+never sees its messages shuffled. The awaiting consumer gets the
+rendered message back for its nonce ack as soon as the batch is stored.
+A failed group send is only logged, the message is in the db and the
+room gets it with its history, a retry would only store it twice.
+'''
+import asyncio
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.db import connection, transaction
+
+from bubblyb.utils import instrumented
+
+from .models import Room, Message
+from .signals import messages_created
+from . import publisher
+
+logger = logging.getLogger('bubblyb.chat')
+
+FLUSH_DELAY = .005
+MAX_BATCH = 100
+
+
+@database_sync_to_async
+@instrumented('chat.store_messages')
+def store(batch):
+    ''' saves the batch, returns the payload of each message '''
+    objs = [msg for msg, *_ in batch]
+    for obj in objs:
+        obj.batched = True
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Message.objects.bulk_create(objs)
+        else: # no ids back from a bulk insert here
+            for obj in objs:
+                obj.save()
+        # room counters and push notifications, once for the whole batch
+        messages_created.send(sender=Message, messages=objs)
+    return [publisher.payload(msg, authors) for msg, authors, *_ in batch]
+
+
+class MessageWriter(object):
+    def __init__(self):
+        self.pending = [] # (message, authors, sender channel, future)
+        self.task = None
+
+    async def write(self, msg, authors, channel_name):
+        ''' stores and publishes msg, everyone but channel_name gets it '''
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((msg, authors, channel_name, future))
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        return await future
+
+    async def run(self):
+        while self.pending:
+            if len(self.pending) < MAX_BATCH:
+                await asyncio.sleep(FLUSH_DELAY)
+            batch, self.pending = self.pending[:MAX_BATCH], self.pending[MAX_BATCH:]
+            try:
+                payloads = await store(batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (*_, future), data in zip(batch, payloads):
+                if not future.done():
+                    future.set_result(data)
+            for (msg, _, channel_name, _), data in zip(batch, payloads):
+                try:
+                    await get_channel_layer().group_send(
+                        Room.group_name(msg.thread_id),
+                        publisher.group_event(data, exclude=channel_name),
+                    )
+                except Exception:
+                    logger.exception("publishing message %s failed", msg.pk)
+
+
+_writers = weakref.WeakKeyDictionary()
+
+def get_writer():
+    ''' the writer of the running event loop, so one per worker '''
+    loop = asyncio.get_event_loop()
+    if loop not in _writers:
+        _writers[loop] = MessageWriter()
+    return _writers[loop]
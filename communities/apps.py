@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CommunitiesConfig(AppConfig):
+    name = 'communities'
+
+    def ready(self):
+        import communities.signals #noqa
@@ -0,0 +1,15 @@
+from bubblyb.utils import BatchLoader
+
+from .models import Membership
+
+
+class MembershipLoader(BatchLoader):
+    ''' the request user's Membership in each community on the page '''
+    context_key = 'membership'
+
+    def batch_load(self, community_ids):
+        me = self.context['request'].user
+        if me.is_anonymous:
+            return {}
+        ships = Membership.objects.filter(user=me, community__in=community_ids)
+        return {ship.community_id: ship for ship in ships}
@@ -95,6 +95,23 @@ class Membership(models.Model):
     )
     role = models.SmallIntegerField(choices=ROLE_LIST, default=MEMBER)
 
+    # role as it is in the db, None for unsaved rows. receivers compare it
+    # against role to tell joins, bans and promotions from other saves
+    previous_role = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.previous_role = instance.__dict__.get('role')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs) # post_save still sees previous_role
+        self.previous_role = self.role
+
+    def role_changed(self):
+        return self.role != self.previous_role
+
     @staticmethod
     def get_joined_communities(user, role=MEMBER):
         qs = Community.objects.all()
@@ -107,22 +124,56 @@ class Membership(models.Model):
         qs = qs.filter(membership__user=you) & qs.filter(membership__user=them)
         return qs
 
+    # role lookups are memoized on the user object for the request and
+    # shared through the cache. communities.signals forgets the shared
+    # entry when a role change commits, so ROLE_TTL only evicts idle ones
+    ROLE_TTL = 60
+    _NOT_JOINED = 'none' # cache.get returns None for misses, so not a member needs its own marker
+
+    @staticmethod
+    def _role_key(community_id, username):
+        return 'role_%s_%s' % (community_id, username)
+
+    @classmethod
+    def get_role(cls, community, user):
+        ''' role of user in community, None if they never joined '''
+        if user.is_anonymous:
+            return None
+        community_id = getattr(community, 'pk', community)
+        roles = user.__dict__.setdefault('_cmty_roles', {})
+        if community_id in roles:
+            return roles[community_id]
+
+        key = cls._role_key(community_id, user.username)
+        role = cache.get(key)
+        if role is None:
+            role = cls.objects.filter(community_id=community_id, user=user) \
+                .values_list('role', flat=True).first()
+            cache.set(key, cls._NOT_JOINED if role is None else role, cls.ROLE_TTL)
+        elif role == cls._NOT_JOINED:
+            role = None
+        roles[community_id] = role
+        return role
+
+    @classmethod
+    def forget_role(cls, ship):
+        cache.delete(cls._role_key(ship.community_id, ship.user_id))
+        if cls.user.is_cached(ship): # usually request.user itself
+            ship.user.__dict__.get('_cmty_roles', {}).pop(ship.community_id, None)
+
     @classmethod
     def check_member(cls, community, user, checkRole=MEMBER):
-        try:
-            ship = cls.objects.get(community=community, user=user)
-            if ship.role >= checkRole:
-                return True
-        except cls.DoesNotExist:
-            if checkRole == cls.VISITANT:
-                cls.objects.create(
-                    community = community,
+        role = cls.get_role(community, user)
+        if role is None:
+            if checkRole == cls.VISITANT and not user.is_anonymous:
+                ship, _ = cls.objects.get_or_create(
+                    community_id = getattr(community, 'pk', community),
                     user = user,
-                    role = checkRole
+                    defaults = {'role': checkRole}
                 )
-                return True
-        except: return False
-        return False
+                return ship.role >= checkRole
+            return False
+        return role >= checkRole
 
 # def raise_reputation(sender, **kwargs):
 #     if kwargs['created']:
@@ -5,22 +5,25 @@ from django.utils.timezone import now
 from string import ascii_lowercase
 
 from .models import Community, Membership
+from .loaders import MembershipLoader
 
 from bubblyb.utils import (
     NestedFlattenerMixin,
     DynamicFieldsMixin,
-    LoggedInExclsvFldsMixin
+    LoggedInExclsvFldsMixin,
+    PrimedListSerializer,
+    render,
 )
 
 
 class GetMembershipMixin(serializers.ModelSerializer):
     def get_membership_info(self, obj):
-        try:
-            return MembershipSerializer(
-                Membership.objects.get(community=obj, user=self.context['request'].user)
-            ).data
-        except Membership.DoesNotExist:
-            return None
+        ship = MembershipLoader.of(self.context).load(obj.pk)
+        return render(MembershipSerializer, ship) if ship else None
+
+    def prime(self, communities):
+        if 'membership_info' in self.fields:
+            MembershipLoader.of(self.context).prime(cmty.pk for cmty in communities)
             
 class CommunityPeakSerializer(DynamicFieldsMixin, GetMembershipMixin):
     dyna_fld_kwarg = 'cmty_fields'
@@ -32,6 +35,7 @@ class CommunityPeakSerializer(DynamicFieldsMixin, GetMembershipMixin):
             'icon_img',
             'theme_color',
         )
+        list_serializer_class = PrimedListSerializer
     def get_cover_img(self, obj):
         return obj.cover_img
     def get_moto(self, obj):
@@ -51,12 +55,19 @@ class MembershipSerializer(NestedFlattenerMixin, DynamicFieldsMixin, serializers
             'role',
             'reputation_point',
         )
+        list_serializer_class = PrimedListSerializer
     def get_community(self, obj):
         self.to_flatten = 'community'
-        return CommunityPeakSerializer(obj.community, context=self.context).data
+        return render(CommunityPeakSerializer, obj.community, self.context)
     def get_user(self, obj):
         self.to_flatten = 'user'
-        return UserPeakSerializer(obj.user, context=self.context).data
+        return render(UserPeakSerializer, obj.user, self.context)
+
+    def prime(self, ships):
+        if 'user' in self.fields:
+            UserPeakSerializer(context=self.context).prime([ship.user for ship in ships])
+        if 'community' in self.fields:
+            CommunityPeakSerializer(context=self.context).prime([ship.community for ship in ships])
 
 
 from accounts.serializers import UserPeakSerializer
@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Membership
+
+
+def _forget(ship):
+    # right away for this process, and again once it's committed: any
+    # process reading the role in between caches the old one, and a ban
+    # can't wait for ROLE_TTL
+    Membership.forget_role(ship)
+    transaction.on_commit(lambda: Membership.forget_role(ship))
+
+@receiver(post_save, sender=Membership)
+def membership_saved(sender, instance, **kwargs):
+    # joined, banned or promoted. reputation points don't touch the role
+    if instance.role_changed():
+        _forget(instance)
+
+@receiver(post_delete, sender=Membership)
+def membership_deleted(sender, instance, **kwargs):
+    _forget(instance)
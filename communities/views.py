@@ -13,7 +13,7 @@ from django.db.models import Prefetch, Count, Q
 from .models import Community, Membership
 from posts.models import Post, Content
 from reacts.models import Icon, Reaction
-from chat.models import Room, PublicRoom, Message
+from chat.models import Room, PublicRoom
 
 from . import serializers
 from chat.serializers import PublicRoomsSerializer
@@ -171,9 +171,7 @@ class CmtyRoomListAPIView(GetCommunityMixin, PaginationMixin, generics.ListAPIVi
 
     def get_big_queryset(self):
         qs = PublicRoom.objects.all()
-        qs = qs.select_related('room')
-        qs = qs.prefetch_related( Prefetch('room__message_set',
-            queryset=Message.objects.order_by('-timestamp')) )
+        qs = qs.select_related('room__last_message')
         qs = qs.filter(associated_with = self.get_community_obj())
         return qs
 
@@ -0,0 +1,225 @@
+'''
+Push notifications, off the request path
+
+push() only puts the push on a bounded queue, a worker thread does the
+rest. It waits BATCH_WINDOW after the first push for more to come,
+folds pushes that share a coalesce key into one "N new ..." push per
+recipient (a burst of chat messages in a room), holds back what goes
+over a recipient's rate limit and sends every distinct payload once,
+with all of its recipients, through one keep-alive session. Held pushes
+keep folding with whatever comes after them and go out as soon as the
+recipient's limit allows. Failed sends are retried with backoff.
+
+The transport is settings.PUSH_TRANSPORT, FakeTransport keeps what it
+was given in memory for tests and offline work.
+'''
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('bubblyb.push')
+
+QUEUE_SIZE = 10000
+BATCH_WINDOW = 2     # seconds to wait for more pushes after the first one
+MAX_BATCH = 1000     # pushes taken off the queue at once
+RATE_LIMIT = (5, 60) # at most 5 pushes per user per 60s
+RETRIES = 3
+BACKOFF = .5         # doubles every retry
+
+
+class TransportError(Exception):
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class OneSignalTransport(object):
+    URL = "https://onesignal.com/api/v1/notifications"
+    MAX_RECIPIENTS = 2000 # include_external_user_ids limit
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Content-Type": "application/json; charset=utf-8",
+            "Authorization": "Basic " + os.getenv('ONESIGNAL_AUTH_KEY', ''),
+        })
+        self.app_id = os.getenv('ONESIGNAL_APP_ID')
+
+    def send(self, recipients, payload):
+        data = dict(payload, app_id=self.app_id, include_external_user_ids=recipients)
+        try:
+            response = self.session.post(self.URL, data=json.dumps(data), timeout=10)
+        except requests.RequestException as e:
+            raise TransportError(str(e))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransportError(f"{response.status_code} {response.reason}")
+        if response.status_code >= 400:
+            raise TransportError(f"{response.status_code} {response.text[:200]}", retry=False)
+
+
+class FakeTransport(object):
+    MAX_RECIPIENTS = 2000
+    sent = [] # (recipients, payload) of every instance
+
+    def send(self, recipients, payload):
+        self.sent.append((recipients, payload))
+
+
+class Push(object):
+    def __init__(self, recipients, message, url, title, image, coalesce, coalesced_message):
+        self.recipients = recipients
+        self.message = message
+        self.url = url
+        self.title = title
+        self.image = image
+        self.coalesce = coalesce
+        self.coalesced_message = coalesced_message
+
+    def payload(self, count=1):
+        message = self.coalesced_message.format(count=count) if count > 1 else self.message
+        return {
+            "headings": {"en": self.title},
+            "contents": {"en": message},
+            "url": self.url,
+            "chrome_web_icon": self.image,
+        }
+
+
+class PushDispatcher(object):
+    def __init__(self, transport):
+        self.transport = transport
+        self.queue = queue.Queue(QUEUE_SIZE)
+        # recipient -> times of their pushes within the rate limit window.
+        # only ever touched by the worker, recipients with none get dropped
+        self.sent_at = {}
+        # (recipient, coalesce key) -> (count, latest push) over the rate limit
+        self.held = OrderedDict()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def push(self, recipients, message, url, title="", image="",
+            coalesce=None, coalesced_message="{count} new notifications"):
+        '''
+        recipients is an iterable of usernames, or a function returning one
+        that gets called on the worker (to keep queries off the request).
+        Pushes with the same coalesce key to the same user within a batch
+        become one, saying coalesced_message
+        '''
+        try:
+            self.queue.put_nowait(Push(recipients, message, url, title, image, coalesce, coalesced_message))
+        except queue.Full:
+            logger.warning("push queue full, dropping push")
+            return
+        self.start()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='push-dispatcher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            try: # wake up for held pushes even if nothing new comes
+                batch = [self.queue.get(timeout=self.held_for())]
+            except queue.Empty:
+                batch = []
+            deadline = time.monotonic() + BATCH_WINDOW
+            while batch and len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.dispatch(batch)
+            except Exception:
+                logger.exception("push batch failed")
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self.queue.task_done()
+
+    def dispatch(self, batch):
+        # (recipient, coalesce key) -> (count, latest push), held ones first
+        folded, self.held = self.held, OrderedDict()
+        for push in batch:
+            recipients = push.recipients() if callable(push.recipients) else push.recipients
+            for recipient in recipients:
+                key = (recipient, push.coalesce if push.coalesce is not None else id(push))
+                count, _ = folded.get(key, (0, None))
+                folded[key] = (count + 1, push)
+
+        # same payload, one call for all its recipients
+        now = time.monotonic()
+        self.forget_stale(now)
+        payloads = OrderedDict()
+        for key, (count, push) in folded.items():
+            if not self.allow(key[0], now):
+                self.held[key] = (count, push)
+                continue
+            payload = push.payload(count)
+            payloads.setdefault(json.dumps(payload, sort_keys=True), (payload, []))[1].append(key[0])
+
+        size = self.transport.MAX_RECIPIENTS
+        for payload, recipients in payloads.values():
+            for i in range(0, len(recipients), size):
+                self.send(recipients[i:i+size], payload)
+
+    def allow(self, recipient, now):
+        limit, window = RATE_LIMIT
+        sent = self.sent_at.setdefault(recipient, deque())
+        while sent and sent[0] <= now - window:
+            sent.popleft()
+        if len(sent) >= limit:
+            return False
+        sent.append(now)
+        return True
+
+    def forget_stale(self, now):
+        ''' recipients whose latest push is out of the window, so sent_at doesn't grow forever '''
+        window = RATE_LIMIT[1]
+        for recipient in [r for r, sent in self.sent_at.items() if sent[-1] <= now - window]:
+            del self.sent_at[recipient]
+
+    def held_for(self):
+        ''' seconds until the first held push may go out, None if there is none '''
+        if not self.held:
+            return None
+        window = RATE_LIMIT[1]
+        now = time.monotonic()
+        return max(0, min(self.sent_at[recipient][0] + window - now for recipient, _ in self.held))
+
+    def send(self, recipients, payload):
+        for attempt in range(RETRIES + 1):
+            try:
+                return self.transport.send(recipients, payload)
+            except TransportError as e:
+                if not e.retry or attempt == RETRIES:
+                    logger.warning("push to %d users failed: %s", len(recipients), e)
+                    return
+                time.sleep(BACKOFF * 2 ** attempt)
+
+    def wait(self):
+        ''' blocks until everything queued so far was handled, for tests '''
+        self.queue.join()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            transport = getattr(settings, 'PUSH_TRANSPORT', 'notification.dispatcher.OneSignalTransport')
+            _dispatcher = PushDispatcher(import_string(transport)())
+        return _dispatcher
@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+from notification.models import Notification, Clearance
+
+MAX_AGE_DAYS = 90
+KEEP = 200 # newest notifications kept per receiver
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Delete cleared, expired and over the cap notifications, a few at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=MAX_AGE_DAYS, help="Days to keep notifications")
+        parser.add_argument('--keep', type=int, default=KEEP, help="Notifications to keep per receiver")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+            help="Primary keys covered by one delete")
+        parser.add_argument('--sleep', type=float, default=.1, help="Seconds to wait between deletes")
+        parser.add_argument('--dry-run', action='store_true',
+            help="Only count, a notification can be counted under more than one reason")
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.sleep = options['sleep']
+
+        self.prune_ranges('cleared', Exists(Clearance.objects.filter(
+            receiver = OuterRef('receiver'), cleared_at__gte = OuterRef('timestamp'))))
+        self.prune_ranges('expired',
+            Q(timestamp__lt=timezone.now() - timedelta(days=options['max_age'])))
+        self.prune_over_cap(options['keep'])
+
+    def prune_ranges(self, label, condition):
+        ''' walks the table by primary key range so no delete holds locks for long '''
+        bounds = Notification.objects.aggregate(lo=Min('pk'), hi=Max('pk'))
+        total = 0
+        if bounds['lo'] is not None:
+            for start in range(bounds['lo'], bounds['hi'] + 1, self.batch_size):
+                qs = Notification.objects.filter(pk__gte=start, pk__lt=start + self.batch_size) \
+                    .filter(condition)
+                total += self.delete(qs)
+        self.report(label, total)
+
+    def prune_over_cap(self, keep):
+        crowded = list(Notification.objects.order_by().values('receiver') \
+            .annotate(n=Count('pk')).filter(n__gt=keep).values_list('receiver', flat=True))
+        total = 0
+        for receiver in crowded:
+            pks = list(Notification.objects.filter(receiver=receiver) \
+                .order_by('-timestamp', '-pk').values_list('pk', flat=True)[keep:])
+            for i in range(0, len(pks), self.batch_size):
+                total += self.delete(Notification.objects.filter(pk__in=pks[i:i + self.batch_size]))
+        self.report('over the cap', total)
+
+    def delete(self, qs):
+        if self.dry_run:
+            return qs.count()
+        deleted, _ = qs.delete()
+        if deleted and self.sleep:
+            time.sleep(self.sleep)
+        return deleted
+
+    def report(self, label, total):
+        self.stdout.write(f"{label}: {total} {'to delete' if self.dry_run else 'deleted'}")
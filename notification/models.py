@@ -1,28 +1,100 @@
-from django.db import models
+import json
+from datetime import datetime, timedelta
+
+from django.db import models, transaction
+from django.db.models import Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.timezone import utc
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
 from accounts.models import User
 
+NEVER = datetime(1970, 1, 1, tzinfo=utc)
+
+
+def content_type_id(obj):
+    ''' content type of a model or instance, from ContentType's per process cache '''
+    return ContentType.objects.get_for_model(obj).id
+
+
 class NotificationManager(models.Manager):
     def generic_filter(self, **kwargs):
         qs = self
         target = kwargs.pop('target', None)
         if target:
             qs = qs.filter(
-                target_content_type = ContentType.objects.get_for_model(type(target)),
-                target_object_id = target.id
+                target_content_type_id = content_type_id(target),
+                target_object_id = target.pk
             )
         act_obj = kwargs.pop('action_object', None)
-        if target:
+        if act_obj:
             qs = qs.filter(
-                action_object_content_type = ContentType.objects.get_for_model(type(act_obj)),
-                action_object_object_id = act_obj.id
+                action_object_content_type_id = content_type_id(act_obj),
+                action_object_object_id = act_obj.pk
             )
         qs = qs.filter(**kwargs)
         return qs
 
+    def visible_to(self, user):
+        ''' user's notifications minus the ones they cleared '''
+        cleared_at = Clearance.objects.filter(receiver=user).values('cleared_at')
+        return self.filter(receiver=user) \
+            .filter(timestamp__gt=Coalesce(Subquery(cleared_at), Value(NEVER)))
+
+    def notify(self, receiver, verb, actor, target=None, action_object=None):
+        '''
+        create() for notifications, except that follows and reactions fold
+        into the receiver's latest notification with the same verb and
+        target, if it is younger than AGGREGATE_WINDOW
+        '''
+        if verb not in self.model.AGGREGATED:
+            return self.create(receiver=receiver, verb=verb, actor=actor,
+                target=target, action_object=action_object)
+        with transaction.atomic():
+            # one notify() per receiver at a time, two first reactions
+            # would both find nothing below and insert a row each
+            list(User.objects.select_for_update().filter(pk=receiver.pk).values_list('pk'))
+            qs = self.generic_filter(
+                receiver = receiver,
+                verb = verb,
+                target = target,
+                timestamp__gte = timezone.now() - self.model.AGGREGATE_WINDOW,
+            )
+            if target is None:
+                qs = qs.filter(target_object_id=None)
+            noti = qs.order_by('-timestamp').first()
+            if noti is None:
+                noti = self.create(receiver=receiver, verb=verb, actor=actor,
+                    target=target, action_object=action_object,
+                    recent_actors=json.dumps([actor.pk]))
+                noti.actors.create(actor=actor)
+                return noti
+            noti.add_actor(actor, action_object)
+            noti.save()
+            return noti
+
+    def retract(self, verb, actor_id, **filters):
+        '''
+        undo notify(). filters narrow down the notifications to look in,
+        by attname (receiver_id, target_object_id as a str...). Runs in
+        the caller's transaction, it goes by the actor and target indexes
+        '''
+        with transaction.atomic():
+            notis = list(self.filter(verb=verb, actors__actor_id=actor_id, **filters)
+                .select_for_update())
+            changed, gone = [], []
+            for noti in notis:
+                noti.actors.filter(actor_id=actor_id).delete()
+                (changed if noti.remove_actor(actor_id) else gone).append(noti)
+            if changed:
+                self.bulk_update(changed, ('actor', 'actor_count', 'recent_actors',
+                    'action_object_content_type', 'action_object_object_id'))
+            if gone:
+                self.filter(pk__in=[noti.pk for noti in gone]).delete()
+
     # def create(self, *args, **kwargs):
         # TODO loop.run_in_executor(None, lambda: super().create(*args, **kwargs))
 
@@ -66,7 +138,72 @@ class Notification(models.Model):
     target_object_id = models.CharField(max_length=255, blank=True, null=True, default=None)
     target = GenericForeignKey('target_content_type', 'target_object_id')
     
+    # actor is the latest one, actor_count counts everyone folded into
+    # this notification (one NotificationActor each) and recent_actors is
+    # a json list of the latest RECENT_ACTORS usernames, latest first
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.TextField(default='[]')
+
+    AGGREGATED = (FOLLOW, REACT)
+    AGGREGATE_WINDOW = timedelta(days=1)
+    RECENT_ACTORS = 5
+
     objects = NotificationManager()
 
+    @property
+    def recent_actor_ids(self):
+        return json.loads(self.recent_actors) or [self.actor_id]
+
+    def add_actor(self, actor, action_object=None):
+        recent = self.recent_actor_ids
+        if self.actors.filter(actor=actor).update(timestamp=timezone.now()):
+            if actor.pk in recent: # reacted again, don't count them twice
+                recent.remove(actor.pk)
+        else:
+            self.actors.create(actor=actor)
+            self.actor_count += 1
+        self.recent_actors = json.dumps([actor.pk] + recent[:self.RECENT_ACTORS - 1])
+        self.actor = actor
+        self.action_object = action_object
+
+    def remove_actor(self, actor_id):
+        ''' after their NotificationActor is gone. False if nobody is left '''
+        self.actor_count -= 1
+        if self.actor_count <= 0:
+            return False
+        if actor_id in self.recent_actor_ids: # refill from the ones left
+            recent = list(self.actors.order_by('-timestamp')
+                .values_list('actor_id', flat=True)[:self.RECENT_ACTORS])
+            self.recent_actors = json.dumps(recent)
+            if self.actor_id == actor_id:
+                self.actor_id = recent[0]
+                self.action_object = None
+        return True
+
     class Meta:
-        ordering = ('-timestamp',)
\ No newline at end of file
+        ordering = ('-timestamp',)
+        indexes = (
+            # object id first, deletes only know that much of the target sometimes
+            models.Index(fields=('target_object_id', 'target_content_type'), name='noti_target_idx'),
+            models.Index(fields=('action_object_object_id', 'action_object_content_type'),
+                name='noti_action_object_idx'),
+        )
+
+
+class NotificationActor(models.Model):
+    ''' everyone folded into an aggregated notification, so any of them can be taken back out '''
+    notification = models.ForeignKey(Notification, related_name='actors', on_delete=models.CASCADE)
+    actor = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('notification', 'actor')
+
+
+class Clearance(models.Model):
+    '''
+    "Clear all" of a user. Notifications up to cleared_at are hidden
+    right away and deleted later by prune_notifications
+    '''
+    receiver = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    cleared_at = models.DateTimeField()
@@ -1,37 +1,22 @@
 import os
-import requests
-import json
-import asyncio
 
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Notification
+from .dispatcher import get_dispatcher
 from chat.models import Message
+from chat import watchers
+from chat.signals import messages_created
 
 
-header = {
-    "Content-Type": "application/json; charset=utf-8",
-    "Authorization": "Basic "+ os.getenv('ONESIGNAL_AUTH_KEY')
-}
-def do_req(data):
-    req = requests.post("https://onesignal.com/api/v1/notifications", headers=header, data=data)
-    # print(req.status_code, req.reason)
-loop = asyncio.get_event_loop()
-def sendPush(to=("long",), message="You have a notification!", click_to=f"{os.getenv('CLIENT_HOST')}/notifications", title="", imageUrl=""):
-    payload = {
-        "app_id": os.getenv('ONESIGNAL_APP_ID'),
-        "include_external_user_ids": to,
-        "headings": {
-            "en": title
-        },
-        "contents": {
-            "en": message
-        },
-        "url": click_to,
-        "chrome_web_icon": imageUrl
-    }
-    # do_req(data=json.dumps(payload)) # throttling test
-    loop.run_in_executor( None, lambda: do_req(data=json.dumps(payload)) )
+def sendPush(to=("long",), message="You have a notification!", click_to=None, title="", imageUrl="",
+        **kwargs):
+    get_dispatcher().push(
+        to, message,
+        click_to or f"{os.getenv('CLIENT_HOST')}/notifications",
+        title, imageUrl, **kwargs
+    )
 
 
 @receiver(post_save, sender=Notification)
@@ -39,25 +24,38 @@ def new_notification(sender, **kwargs):
     obj = kwargs['instance']
     if kwargs.get('created'):
         sendPush(
-            (obj.receiver.username,),
+            (obj.receiver_id,),
             obj.actor.alias+" "+obj.get_verb_display(),
-            imageUrl = obj.actor.profile_pic
+            imageUrl = obj.actor.profile_pic,
+            coalesce = 'noti',
         )
         
 @receiver(post_save, sender=Message)
-def new_message(sender, **kwargs):
-    obj = kwargs['instance']
-    if kwargs.get('created'):
-        to_send = obj.thread.roommate_set.exclude(identity=obj.author).filter(enable_noti=True) \
-            .values_list('identity', flat=True)
-        if obj.msg_type == 1:
-            content = ": "+obj.content
-        else:
-            content = " sent a message"
-        sendPush(
-            tuple(to_send),
-            obj.author.alias + content,
-            f"{os.getenv('CLIENT_HOST')}/chat/t/"+str(obj.thread.id),
-            obj.thread.name or "Chat message",
-            obj.author.profile_pic,
-        )
\ No newline at end of file
+def new_message(sender, instance, created, **kwargs):
+    if created and not instance.batched:
+        push_message(instance)
+
+@receiver(messages_created, sender=Message)
+def new_messages(sender, messages, **kwargs):
+    # the dispatcher coalesces them per room
+    def send():
+        for msg in messages:
+            push_message(msg)
+    transaction.on_commit(send)
+
+def push_message(obj):
+    def to_send(): # runs on the dispatcher's thread
+        return watchers.push_recipients(obj.thread_id, obj.author_id)
+    if obj.msg_type == 1:
+        content = ": "+obj.content
+    else:
+        content = " sent a message"
+    sendPush(
+        to_send,
+        obj.author.alias + content,
+        f"{os.getenv('CLIENT_HOST')}/chat/t/"+str(obj.thread_id),
+        obj.thread.name or "Chat message",
+        obj.author.profile_pic,
+        coalesce = f'room_{obj.thread_id}',
+        coalesced_message = "{count} new messages",
+    )
@@ -2,13 +2,18 @@ from rest_framework import serializers
 
 from .models import Notification
 
+from accounts.models import User
 from accounts.serializers import UserPeakSerializer
+from bubblyb.utils import PrimedListSerializer, render, resolve_generic
+from posts.models import Comment, Post
+from reacts.models import Reaction
 
 def truncate(str_):
     return (str_[:75] + '...') if len(str_) > 75 else str_
 
 class NotificationListSerializer(serializers.ModelSerializer):
     actor = serializers.SerializerMethodField()
+    others = serializers.SerializerMethodField()
     verb = serializers.CharField(source='get_verb_display')
     action_object = serializers.SerializerMethodField()
     target = serializers.SerializerMethodField()
@@ -19,12 +24,35 @@ class NotificationListSerializer(serializers.ModelSerializer):
             'timestamp',
             # 'unread',
             'actor',
+            'actor_count',
+            'others',
             'verb',
             'action_object',
             'target',
         )
+        list_serializer_class = PrimedListSerializer
     def get_actor(self, obj):
-        return UserPeakSerializer(obj.actor, context=self.context).data
+        return render(UserPeakSerializer, obj.actor, self.context)
+
+    def get_others(self, obj):
+        ''' the latest few of the actor_count - 1 others '''
+        if obj.actor_count == 1:
+            return []
+        users = self.context.get('noti_actors') or User.objects.in_bulk(obj.recent_actor_ids)
+        return [render(UserPeakSerializer, users[pk], self.context)
+            for pk in obj.recent_actor_ids if pk != obj.actor_id and pk in users]
+
+    def prime(self, notis):
+        users = {noti.actor_id: noti.actor for noti in notis}
+        missing = {pk for noti in notis if noti.actor_count > 1
+            for pk in noti.recent_actor_ids if pk not in users}
+        if missing:
+            users.update(User.objects.in_bulk(missing))
+        self.context['noti_actors'] = users
+        UserPeakSerializer(context=self.context).prime(users.values())
+        # what get_action_object and get_target read, a query per content type
+        resolve_generic(notis, 'action_object', {Reaction: ('icon',), Comment: ('content',)})
+        resolve_generic(notis, 'target', {Post: ('content',), Comment: ('content',)})
 
     def get_action_object(self, obj):
         act_obj = obj.action_object
@@ -1,7 +1,8 @@
+from django.db.models import Q
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from .models import Notification
+from .models import Notification, content_type_id
 from relationships.models import Relationship
 from reacts.models import Reaction
 from posts.models import Comment
@@ -9,20 +10,18 @@ from posts.models import Comment
 @receiver([post_save, post_delete], sender=Relationship)
 def hi_bye(sender, **kwargs):
     obj = kwargs['instance']
-    me = obj.to_user
-    them = obj.from_user
     if kwargs.get('created'):
-        Notification.objects.create(
-            actor = them,
+        Notification.objects.notify(
+            actor = obj.from_user,
             verb = Notification.FOLLOW,
-            receiver = me,
+            receiver = obj.to_user,
         )
-    else:
-        Notification.objects.filter(
-            actor = them,
+    elif kwargs['signal'] is post_delete:
+        Notification.objects.retract(
+            actor_id = obj.from_user_id,
             verb = Notification.FOLLOW,
-            receiver = me
-        ).delete()
+            receiver_id = obj.to_user_id
+        )
 
 @receiver([post_save, post_delete], sender=Reaction)
 def reacted(sender, **kwargs):
@@ -32,35 +31,40 @@ def reacted(sender, **kwargs):
         if obj.user != content.author:
             post_or_cmt = content.post if hasattr(content, 'post') else \
                 content.comment if hasattr(content, 'comment') else content
-            Notification.objects.create(
+            Notification.objects.notify(
                 actor = obj.user,
                 verb = Notification.REACT,
                 action_object = obj,
                 target = post_or_cmt,
                 receiver = content.author,
             )
-    else:
-        Notification.objects.filter(
-            actor = obj.user,
-            target_object_id = obj.to_id
-        ).delete()
+    elif kwargs['signal'] is post_delete: # not when the icon changed
+        Notification.objects.retract(
+            actor_id = obj.user_id,
+            verb = Notification.REACT,
+            target_object_id = str(obj.to_id) # post and comment pks are their content's
+        )
 
 @receiver([post_save, post_delete], sender=Comment)
 def commented_on_post(sender, **kwargs):
     obj = kwargs['instance']
-    commented_on = obj.reply_to if obj.reply_to else obj.on
-    if kwargs.get('created') and obj.content.author!=commented_on.content.author:
-        Notification.objects.create(
-            actor = obj.content.author,
-            verb = Notification.COMMENT,
-            action_object = obj,
-            target = commented_on,
-            receiver = commented_on.content.author,
-        )
-    else:
-        Notification.objects.generic_filter(
-            actor = obj.content.author,
-            action_object = obj,
+    if kwargs.get('created'):
+        commented_on = obj.reply_to if obj.reply_to else obj.on
+        if obj.content.author_id != commented_on.content.author_id:
+            Notification.objects.create(
+                actor = obj.content.author,
+                verb = Notification.COMMENT,
+                action_object = obj,
+                target = commented_on,
+                receiver = commented_on.content.author,
+            )
+    elif kwargs['signal'] is post_delete:
+        # the post or content may be gone already when this is a cascade,
+        # so only what's on obj itself
+        ct_id = content_type_id(Comment)
+        Notification.objects.filter(
+            Q(action_object_content_type_id=ct_id, action_object_object_id=str(obj.pk)) |
+            Q(target_content_type_id=ct_id, target_object_id=str(obj.pk))
         ).delete()
 
 # post_save.connect(
\ No newline at end of file
@@ -1,3 +1,175 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from communities.models import Community, Membership
+from posts.models import Content, Post
+from reacts.models import Icon, Reaction
+from .dispatcher import PushDispatcher, Push, FakeTransport, RATE_LIMIT
+from .models import Notification
+
+
+class PushDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.transport = FakeTransport()
+        self.transport.sent = []
+        self.dispatcher = PushDispatcher(self.transport)
+        self.now = 1000.0
+        patcher = mock.patch('notification.dispatcher.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make(self, recipients, message, coalesce=None, coalesced_message="{count} new messages"):
+        return Push(recipients, message, 'url', 'title', '', coalesce, coalesced_message)
+
+    def messages(self):
+        return [(sorted(recipients), payload['contents']['en']) for recipients, payload in self.transport.sent]
+
+    def test_one_send_per_payload(self):
+        self.dispatcher.dispatch([
+            self.make(['a', 'b'], 'hi'),
+            self.make(lambda: ['c'], 'hi'),
+            self.make(['a'], 'bye'),
+        ])
+        self.assertEqual(self.messages(), [(['a', 'b', 'c'], 'hi'), (['a'], 'bye')])
+
+    def test_coalesced_per_recipient(self):
+        self.dispatcher.dispatch([
+            self.make(['a', 'b'], 'm1', coalesce='room_1'),
+            self.make(['a'], 'm2', coalesce='room_1'),
+            self.make(['a'], 'm3', coalesce='room_1'),
+        ])
+        self.assertEqual(self.messages(), [(['a'], '3 new messages'), (['b'], 'm1')])
+
+    def test_rate_limited_pushes_are_held_not_dropped(self):
+        limit, window = RATE_LIMIT
+        for i in range(limit):
+            self.dispatcher.dispatch([self.make(['a'], f'n{i}')])
+            self.now += 1
+        self.dispatcher.dispatch([self.make(['a'], 'late', coalesce='noti')])
+        self.dispatcher.dispatch([self.make(['a'], 'later', coalesce='noti')])
+        self.assertEqual(len(self.transport.sent), limit)
+        self.assertTrue(self.dispatcher.held)
+        self.assertAlmostEqual(self.dispatcher.held_for(), window - limit)
+
+        self.now += window
+        self.dispatcher.dispatch([])
+        self.assertEqual(self.messages()[-1], (['a'], '2 new messages'))
+        self.assertFalse(self.dispatcher.held)
+        self.assertIsNone(self.dispatcher.held_for())
+
+    def test_rate_limit_is_per_recipient(self):
+        limit, _ = RATE_LIMIT
+        self.dispatcher.dispatch([self.make(['a'], f'n{i}') for i in range(limit + 1)])
+        self.dispatcher.dispatch([self.make(['b'], 'hi')])
+        self.assertEqual(len(self.transport.sent), limit + 1)
+        self.assertEqual(self.messages()[-1], (['b'], 'hi'))
+
+    def test_idle_recipients_are_forgotten(self):
+        _, window = RATE_LIMIT
+        self.dispatcher.dispatch([self.make(['a', 'b'], 'hi')])
+        self.assertEqual(set(self.dispatcher.sent_at), {'a', 'b'})
+        self.now += window
+        self.dispatcher.dispatch([self.make(['c'], 'hi')])
+        self.assertEqual(set(self.dispatcher.sent_at), {'c'})
+
+
+class ReactionNotificationTests(TransactionTestCase):
+    ''' real commits and savepoints, so no TestCase transaction around these '''
+    def setUp(self):
+        self.author, self.a, self.b = [
+            User.objects.create_user(username=name, email=f'{name}@a.a', password='x')
+            for name in ('author', 'a', 'b')
+        ]
+        community = Community.objects.create(id='cm', name='cm')
+        for user in (self.author, self.a, self.b):
+            Membership.objects.create(user=user, community=community)
+        self.icons = [Icon.objects.create(uploader=self.author, name=f'i{i}', img_src='src')
+            for i in range(2)]
+        self.content = Content.objects.create(author=self.author, text='hi')
+        Post.objects.create(content=self.content, title='t', allocated_to=community)
+
+    def react(self, user, icon=0):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(f'/reacts/{self.content.pk}', {'icon': self.icons[icon].pk})
+        self.assertEqual(response.status_code, 201)
+
+    def unreact(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.delete(f'/reacts/{self.content.pk}').status_code, 204)
+
+    def notifications(self):
+        return list(Notification.objects.filter(verb=Notification.REACT, receiver=self.author))
+
+    def test_reactions_fold_into_one(self):
+        self.react(self.a)
+        self.react(self.b)
+        noti, = self.notifications()
+        self.assertEqual(noti.actor_id, 'b')
+        self.assertEqual(noti.actor_count, 2)
+        self.assertEqual(noti.recent_actor_ids, ['b', 'a'])
+
+        client = APIClient()
+        client.force_authenticate(self.author)
+        listed, = client.get('/notifications/all/').data
+        self.assertEqual(listed['actor_count'], 2)
+
+    def test_own_reaction_is_not_notified(self):
+        self.react(self.author)
+        self.assertEqual(self.notifications(), [])
+
+    def test_other_icon_keeps_the_notification(self):
+        self.react(self.a, 0)
+        self.react(self.a, 1)
+        noti, = self.notifications()
+        self.assertEqual(noti.actor_count, 1)
+        self.assertEqual(noti.action_object, Reaction.objects.get(user=self.a))
+
+    def test_other_icon_after_someone_else(self):
+        self.react(self.a)
+        self.react(self.b)
+        self.react(self.a, 1)
+        noti, = self.notifications()
+        self.assertEqual(noti.actor_count, 2)
+        self.assertEqual(noti.recent_actor_ids, ['a', 'b'])
+
+    def test_unreact_retracts(self):
+        self.react(self.a)
+        self.react(self.b)
+        self.unreact(self.b)
+        noti, = self.notifications()
+        self.assertEqual((noti.actor_id, noti.actor_count, noti.recent_actor_ids), ('a', 1, ['a']))
+        self.unreact(self.a)
+        self.assertEqual(self.notifications(), [])
+
+    def test_actors_past_the_recent_ones_can_be_retracted(self):
+        with mock.patch.object(Notification, 'RECENT_ACTORS', 1):
+            self.react(self.a)
+            self.react(self.b)
+            self.unreact(self.a) # only b is in recent_actors
+            noti, = self.notifications()
+            self.assertEqual((noti.actor_id, noti.actor_count, noti.recent_actor_ids), ('b', 1, ['b']))
+            self.react(self.a)
+            self.unreact(self.b)
+            noti, = self.notifications()
+            self.assertEqual((noti.actor_id, noti.actor_count, noti.recent_actor_ids), ('a', 1, ['a']))
+
+    def test_rolled_back_savepoint_keeps_the_notification(self):
+        self.react(self.a)
+        self.react(self.b)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Reaction.objects.get(user=self.b).delete()
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                Reaction.objects.get(user=self.a).delete()
+        noti, = self.notifications()
+        self.assertEqual((noti.actor_id, noti.actor_count), ('b', 1))
@@ -5,12 +5,13 @@ from rest_framework import (
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.utils import timezone
 
 from .serializers import (
     NotificationListSerializer,
 )
 
-from .models import Notification
+from .models import Notification, Clearance
 
 from bubblyb.utils import PaginationMixin
 
@@ -25,11 +26,12 @@ class NotificationListAPIView(PaginationMixin, generics.ListAPIView):
         return context
     
     def get_big_queryset(self):
-        qs = Notification.objects.all()
-        qs = qs.filter(receiver=self.request.user)
+        qs = Notification.objects.visible_to(self.request.user)
+        qs = qs.select_related('actor')
         return qs
         
     def delete(self, request, *args, **kwargs):
-        qs = self.get_big_queryset()
-        qs.delete()
+        # only moves the watermark, prune_notifications deletes them
+        Clearance.objects.update_or_create(receiver=request.user,
+            defaults={'cleared_at': timezone.now()})
         return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -0,0 +1 @@
+default_app_config = 'posts.apps.PostsConfig'
\ No newline at end of file
@@ -0,0 +1,136 @@
+'''
+Materialized home feeds (fan-out on write)
+
+Every user gets a redis sorted set of post ids scored by post timestamp,
+capped at FEED_SIZE. New posts only get pushed into feeds that are
+already warm, cold feeds are rebuilt from the db on first read.
+
+The feed is the window of the user's newest posts, the view serves pages
+from it and only goes to the db for the older posts past it. The
+sentinel marks a feed that holds every post: it is only written when
+everything fit, and scored lowest it is the first member the cap trims
+away. FEED_SIZE is the size the sorted sets are allowed to grow to, not a
+limit on what users get to see.
+
+A rebuild reads the db before it writes the feed, so a post fanned out
+in between would miss both. It claims the feed with a build key first,
+push_post writes into claimed feeds too, and the rebuild only lands if
+its claim is still there, drop_feed takes the claim away.
+'''
+from uuid import uuid4
+from datetime import datetime
+
+from django.utils.timezone import utc
+
+from bubblyb.utils.shared_redis import get_redis, UNAVAILABLE
+
+from .models import Post
+from communities.models import Membership
+
+FEED_SIZE = 500
+FEED_TTL = 60 * 60 * 24 * 7 # inactive users lose their feed after a week
+FANOUT_CHUNK = 1000
+BUILD_TTL = 60 # a rebuild that takes longer than this loses its claim
+# marks a feed as warm and complete, even when there is nothing in it. never a real post id
+SENTINEL = '0'
+
+# push into a feed only if it already exists or is being rebuilt, so
+# cold feeds stay cold. KEYS are feed and build key pairs
+_PUSH_SCRIPT = '''
+for i = 1, #KEYS, 2 do
+    local building = redis.call('exists', KEYS[i+1]) == 1
+    if building or redis.call('exists', KEYS[i]) == 1 then
+        redis.call('zadd', KEYS[i], ARGV[1], ARGV[2])
+        redis.call('zremrangebyrank', KEYS[i], 0, -tonumber(ARGV[3]) - 1)
+        if building then -- the rebuild sets the real ttl
+            redis.call('expire', KEYS[i], ARGV[4])
+        end
+    end
+end
+'''
+
+# land a rebuild if its claim is still there. ARGV is the claim, the
+# cap, the ttl then score and member pairs
+_BUILT_SCRIPT = '''
+if redis.call('get', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('del', KEYS[2])
+for i = 4, #ARGV, 2 do
+    redis.call('zadd', KEYS[1], ARGV[i], ARGV[i+1])
+end
+redis.call('zremrangebyrank', KEYS[1], 0, -tonumber(ARGV[2]) - 1)
+redis.call('expire', KEYS[1], ARGV[3])
+return 1
+'''
+
+def _key(username):
+    return 'feed_%s' % username
+
+def _build_key(username):
+    return 'feed_build_%s' % username
+
+
+def push_post(post):
+    ''' fan a freshly created post out to its community members '''
+    members = Membership.objects.filter(
+        community_id = post.allocated_to_id,
+        role__gte = Membership.MEMBER
+    ).values_list('user', flat=True)
+    keys = [key for username in members for key in (_key(username), _build_key(username))]
+    score = post.content.timestamp.timestamp()
+    try:
+        push = get_redis().register_script(_PUSH_SCRIPT)
+        for i in range(0, len(keys), 2 * FANOUT_CHUNK):
+            push(keys=keys[i:i+2*FANOUT_CHUNK], args=[score, post.pk, FEED_SIZE, BUILD_TTL])
+    except UNAVAILABLE:
+        pass # feeds get rebuilt on next read anyway
+
+
+def get_feed(user):
+    '''
+    (post ids, timestamp of the oldest) of a warm feed, the timestamp is
+    None when the feed holds every post. None if the feed is cold
+    '''
+    key = _key(user.username)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zrevrange(key, 0, -1, withscores=True)
+        pipe.expire(key, FEED_TTL)
+        rows, _ = pipe.execute()
+    except UNAVAILABLE:
+        return None
+    if not rows:
+        return None
+    if rows[-1][0].decode() == SENTINEL:
+        return [int(pk) for pk, _ in rows[:-1]], None
+    return [int(pk) for pk, _ in rows], datetime.fromtimestamp(rows[-1][1], tz=utc)
+
+
+def rebuild_feed(user):
+    key, build_key = _key(user.username), _build_key(user.username)
+    claim = uuid4().hex
+    try:
+        get_redis().set(build_key, claim, ex=BUILD_TTL)
+    except UNAVAILABLE:
+        return
+
+    rows = Post.objects.filter(
+        allocated_to__in = Membership.get_joined_communities(user)
+    ).order_by('-content__timestamp').values_list('pk', 'content__timestamp')[:FEED_SIZE]
+    args = [claim, FEED_SIZE, FEED_TTL]
+    for pk, timestamp in rows:
+        args += [timestamp.timestamp(), pk]
+    if len(args) < 3 + 2 * FEED_SIZE: # room for the sentinel, nothing was cut off
+        args += ['-inf', SENTINEL]
+    try:
+        get_redis().register_script(_BUILT_SCRIPT)(keys=[key, build_key], args=args)
+    except UNAVAILABLE:
+        pass
+
+
+def drop_feed(username):
+    try:
+        get_redis().delete(_key(username), _build_key(username))
+    except UNAVAILABLE:
+        pass
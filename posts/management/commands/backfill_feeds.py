@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from communities.models import Membership
+
+from posts.feeds import rebuild_feed
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home feeds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only rebuild these users' feeds")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(membership__role__gte=Membership.MEMBER).distinct()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        rebuilt = 0
+        for user in users.only('username').iterator():
+            rebuild_feed(user)
+            rebuilt += 1
+        self.stdout.write(f"Rebuilt {rebuilt} feeds")
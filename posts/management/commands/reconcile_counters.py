@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Exists, IntegerField
+from django.db.models.functions import Coalesce
+
+from posts.models import Content, Post, Comment
+from reacts.models import Reaction, ReactionCount
+from chat.models import Room, Roommate, Message
+
+BATCH_SIZE = 1000
+
+
+def counted(qs, group_by):
+    ''' correlated COUNT(*) of qs grouped by `group_by`, 0 when there are no rows '''
+    return Coalesce(Subquery(
+        qs.order_by().values(group_by).annotate(n=Count('pk')).values('n'),
+        output_field = IntegerField()
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = "Repair drift in the denormalized reaction, reply and chat counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drift")
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+
+        self.fix('Content.total_reacts', Content, 'total_reacts',
+            counted(Reaction.objects.filter(to=OuterRef('pk')), 'to'))
+        self.fix('Post.reply_count', Post, 'reply_count',
+            counted(Comment.objects.filter(on=OuterRef('pk')), 'on'))
+        self.fix('Comment.reply_count', Comment, 'reply_count',
+            counted(Comment.objects.filter(reply_to=OuterRef('pk')), 'reply_to'))
+        self.fix('ReactionCount.count', ReactionCount, 'count',
+            counted(Reaction.objects.filter(to=OuterRef('to'), icon=OuterRef('icon')), 'to'))
+        self.fix_missing_reaction_counts()
+
+        self.fix('Room.member_count', Room, 'member_count',
+            counted(Roommate.objects.filter(room=OuterRef('pk')), 'room'))
+        latest = Message.objects.filter(thread=OuterRef('pk')).order_by('-timestamp', '-id')
+        with_messages = Room.objects.filter(Exists(latest))
+        self.fix('Room.last_message', Room, 'last_message_id',
+            Subquery(latest.values('pk')[:1]), with_messages)
+        self.fix('Room.last_message_at', Room, 'last_message_at',
+            Subquery(latest.values('timestamp')[:1]), with_messages)
+        self.fix('Roommate.unread_count', Roommate, 'unread_count',
+            counted(Message.objects.filter(
+                thread = OuterRef('room'), timestamp__gt = OuterRef('last_seen')
+            ).exclude(author=OuterRef('identity')), 'thread'))
+
+    def fix(self, label, model, field, real, qs=None):
+        qs = model.objects.all() if qs is None else qs
+        drifted = list(qs.annotate(real=real).exclude(**{field: F('real')}) \
+            .values_list('pk', 'real'))
+        if not self.dry_run:
+            model.objects.bulk_update(
+                [model(pk=pk, **{field: value}) for pk, value in drifted],
+                [field], batch_size=BATCH_SIZE
+            )
+        self.stdout.write(f"{label}: {len(drifted)} drifted")
+
+    def fix_missing_reaction_counts(self):
+        missing = Reaction.objects.order_by().values('to', 'icon').annotate(
+            n = Count('pk'),
+            counted = Exists(ReactionCount.objects.filter(to=OuterRef('to'), icon=OuterRef('icon'))),
+        ).filter(counted=False)
+        rows = [ReactionCount(to_id=row['to'], icon_id=row['icon'], count=row['n'])
+            for row in missing.iterator()]
+        if not self.dry_run:
+            with transaction.atomic():
+                # django 3.0 doesn't cap batch_size at what the backend can take
+                size = min(BATCH_SIZE, connection.ops.bulk_batch_size(['to', 'icon', 'count'], rows))
+                ReactionCount.objects.bulk_create(rows, batch_size=size)
+        self.stdout.write(f"ReactionCount: {len(rows)} missing")
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
 from django.utils.functional import cached_property
 
 from accounts.models import User
@@ -19,12 +21,17 @@ class Content(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     edited = models.DateTimeField(blank=True, null=True, default=None)
     text = models.TextField(default="")
+    total_reacts = models.PositiveIntegerField(default=0)
     @cached_property
-    def allocated_to(self): # bruh?
-        p = self.post if hasattr(self, 'post') else \
-            self.comment if hasattr(self, 'comment') else \
-            self.pinnedpost if hasattr(self, 'pinnedpost') else Post.objects.get(content_id=1)
-        return p.allocated_to
+    def allocated_to(self):
+        # whichever of post, comment or pinnedpost this is, in one query
+        of_this = lambda model, field: Subquery(model.objects.filter(pk=self.pk).values(field))
+        cmty = Community.objects.filter(pk=Coalesce(
+            of_this(Post, 'allocated_to'),
+            of_this(Comment, 'on__allocated_to'),
+            of_this(PinnedPost, 'allocated_to'),
+        )).first()
+        return cmty or Post.objects.get(content_id=1).allocated_to
 
     objects = ContentManager()
 
@@ -57,7 +64,8 @@ class Post(models.Model):
     def author(self):
         return self.content.author
 
-    hot_score = models.IntegerField(default=0)
+    hot_score = models.IntegerField(default=0, db_index=True)
+    reply_count = models.PositiveIntegerField(default=0) # every comment under it, replies included
 
     def _get_unique_slug(self):
         if self.title:
@@ -79,6 +87,7 @@ class Comment(models.Model):
     on = models.ForeignKey(Post, on_delete=models.CASCADE)
     reply_to = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, default=None)
     content = models.OneToOneField(Content, on_delete=models.CASCADE, primary_key=True)
+    reply_count = models.PositiveIntegerField(default=0) # direct replies only
     @property
     def allocated_to(self):
         return self.on.allocated_to
@@ -86,6 +95,14 @@ class Comment(models.Model):
     def author(self):
         return self.content.author
 
+    def tally_reply(self, delta):
+        ''' keeps reply_count of the post and the replied to comment in step '''
+        Post.objects.filter(pk=self.on_id, reply_count__gte=-delta) \
+            .update(reply_count=models.F('reply_count') + delta)
+        if self.reply_to_id:
+            Comment.objects.filter(pk=self.reply_to_id, reply_count__gte=-delta) \
+                .update(reply_count=models.F('reply_count') + delta)
+
 
 
 class PinnedPost(models.Model):
@@ -97,3 +114,9 @@ class PinnedPost(models.Model):
     class Meta:
         ordering = ('order',)
         # unique_together = ('allocated_to', 'order')
+
+
+class Watermark(models.Model):
+    '''Where a periodic job left off'''
+    name = models.CharField(max_length=40, primary_key=True)
+    value = models.DateTimeField()
@@ -0,0 +1,128 @@
+'''
+Incremental hot score engine
+
+Reddit style score: log10 of engagement plus post age over DECAY.
+Newer posts get a bigger baseline so old posts "decay" without ever
+being rescored, only posts that got new reactions or comments since the
+last run need touching.
+'''
+import os
+from math import log10
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now, utc
+
+from .models import Post, Comment, Watermark
+from reacts.models import Reaction
+from communities.models import Membership
+
+EPOCH = datetime(2020, 1, 1, tzinfo=utc)
+DECAY = 45000 # seconds, ~12.5h newer beats 10x the engagement
+COMMENT_WEIGHT = 2
+SCALE = 1000 # hot_score is an int column
+BATCH_SIZE = 1000
+WATERMARK = 'hot_score'
+
+
+def hot_score(reacts, comments, posted_at):
+    engagement = reacts + COMMENT_WEIGHT * comments
+    order = log10(max(engagement, 1))
+    age = (posted_at - EPOCH).total_seconds()
+    return int(round((order + age / DECAY) * SCALE))
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), BATCH_SIZE):
+        yield ids[i:i+BATCH_SIZE]
+
+
+def changed_posts(since):
+    ''' ids of posts that were created, reacted to or commented on since `since` '''
+    ids = set(Post.objects.filter(content__timestamp__gt=since).values_list('pk', flat=True))
+    ids.update(Reaction.objects.filter(
+        timestamp__gt = since,
+        to__post__isnull = False
+    ).values_list('to', flat=True).distinct())
+    ids.update(Comment.objects.filter(
+        content__timestamp__gt = since
+    ).values_list('on', flat=True).distinct())
+    return ids
+
+
+def rescore(post_ids):
+    ''' reads the stored counters once per batch then bulk_update '''
+    updated = 0
+    for chunk in _chunks(post_ids):
+        rows = Post.objects.filter(pk__in=chunk).values_list(
+            'pk', 'content__total_reacts', 'reply_count', 'content__timestamp')
+        posts = [
+            Post(content_id=pk, hot_score=hot_score(reacts, comments, posted_at))
+            for pk, reacts, comments, posted_at in rows
+        ]
+        Post.objects.bulk_update(posts, ['hot_score'])
+        updated += len(posts)
+    return updated
+
+
+def credit_reputation(since, until):
+    '''
+    every reaction received is worth a reputation point in that
+    community, one CASE update per BATCH_SIZE (author, community) pairs
+    '''
+    groups = Reaction.objects.filter(
+        timestamp__gt = since,
+        timestamp__lte = until,
+    ).annotate(cmty=Coalesce(
+        'to__post__allocated_to',
+        'to__comment__on__allocated_to',
+        'to__pinnedpost__allocated_to',
+    )).values('to__author', 'cmty').annotate(n=Count('pk'))
+    credits = {(group['to__author'], group['cmty']): group['n']
+        for group in groups.iterator() if group['cmty'] is not None}
+
+    for chunk in _chunks(credits):
+        members = Membership.objects.filter(
+            user__in = {user for user, _ in chunk},
+            community__in = {cmty for _, cmty in chunk},
+        ).values_list('pk', 'user', 'community')
+        matched = [(pk, credits[user, cmty]) for pk, user, cmty in members if (user, cmty) in credits]
+        if matched:
+            Membership.objects.filter(pk__in=[pk for pk, _ in matched]).update(
+                reputation_point = F('reputation_point') + Case(
+                    *(When(pk=pk, then=Value(n)) for pk, n in matched),
+                    output_field = IntegerField()
+                )
+            )
+
+
+def _legacy_last_ran():
+    ''' the old calculate_score kept its watermark in a text file '''
+    path = os.path.join(os.path.dirname(__file__), 'management', 'commands', 'last_ran.txt')
+    try:
+        with open(path) as f:
+            return parse_datetime(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def run(full=False):
+    started = now()
+    mark = Watermark.objects.filter(name=WATERMARK).first()
+    since = mark.value if mark else _legacy_last_ran() or EPOCH
+
+    # rescoring is idempotent, only the credit has to happen exactly once
+    rescored = rescore(changed_posts(EPOCH if full else since))
+
+    with transaction.atomic():
+        mark, _ = Watermark.objects.select_for_update().get_or_create(
+            name = WATERMARK, defaults = {'value': since})
+        if mark.value < started: # another run may have got here first
+            credit_reputation(mark.value, started)
+            mark.value = started
+            mark.save()
+    return rescored
@@ -2,12 +2,14 @@ from rest_framework import serializers
 from django.db.models import F
 
 from .models import Content, Attachment, Post, Comment
+from . import feeds, scoring
 from reacts.models import Icon, Reaction
 from relationships.models import Block
 
 from accounts.serializers import UserPeakSerializer
 from communities.serializers import CommunityPeakSerializer
 from reacts.serializers import IconListSerializer
+from reacts.loaders import ReactionSummaryLoader
 
 from django.db.models import Count
 
@@ -17,6 +19,8 @@ from bubblyb.utils import (
     NestedFlattenerMixin,
     DynamicFieldsMixin,
     LoggedInExclsvFldsMixin,
+    PrimedListSerializer,
+    render,
 )
 
 class AttachmentSerializer(serializers.ModelSerializer):
@@ -51,48 +55,30 @@ class ContentSerializer(
     '''
     
     def get_author(self, obj):
-        return UserPeakSerializer(
-            obj.author,
-            context = self.context
-        ).data
+        return render(UserPeakSerializer, obj.author, self.context)
     def get_text(self, obj):
         return obj.text if len(obj.text)<690 else obj.text[:690]+"... Read more"
     def get_attachments_preview(self, obj):
         atchs = obj.attachment_set.all()
         return {
-            "atchs": AttachmentSerializer(atchs[:3], many=True).data,
+            "atchs": [render(AttachmentSerializer, atch) for atch in atchs[:3]],
             "count": atchs.count()
         }
     def get_attachments(self, obj):
-        return AttachmentSerializer(
-            obj.attachment_set.all()[:20],
-            many=True
-        ).data
+        return [render(AttachmentSerializer, atch) for atch in obj.attachment_set.all()[:20]]
     def get_post_or_comment_data(self, obj):
         self.to_flatten = 'post_or_comment_data'
         if hasattr(self, 'post'):
-            return PostSerializer(
-                obj.post,
-                context = self.context
-            ).data
+            return render(PostSerializer, obj.post, self.context)
         elif hasattr(self, 'comment'):
-            return CommentSerializer(
-                obj.comment,
-                context = self.context
-            ).data
+            return render(CommentSerializer, obj.comment, self.context)
         return {}
     def get_reacted_with(self, obj):
         return None # todo get a user's reaction in there profile page
-    def get_reactions(self, obj): # n+1 query
-        # https://code.djangoproject.com/ticket/26565
-        # Todo grow and make good
-        return obj.reaction_set.values(
-                'icon_id',
-                name = F('icon__name'),
-                img_src = F('icon__img_src')
-            ).annotate(count=Count('icon_id'))
+    def get_reactions(self, obj):
+        return ReactionSummaryLoader.of(self.context).load(obj.id)
     def get_total_reacts(self, obj):
-        return obj.reaction_set.count()
+        return obj.total_reacts
     def get_my_react(self, obj):
         try:
             for r in obj.my_react:
@@ -104,6 +90,10 @@ class ContentSerializer(
             except Reaction.DoesNotExist:
                 return None
 
+    def prime(self, objs):
+        if 'reactions' in self.fields:
+            ReactionSummaryLoader.of(self.context).prime(obj.id for obj in objs)
+
     new_attachments = AttachmentSerializer(many=True, write_only=True, required=False)
     class Meta:
         model = Content
@@ -120,6 +110,7 @@ class ContentSerializer(
             'timestamp',
             'edited',
         )
+        list_serializer_class = PrimedListSerializer
     def update(self, instance, validated_data):
         attachments_data = validated_data.get('new_attachments')
         if attachments_data:
@@ -141,20 +132,17 @@ class PostAndCommentSerializer(NestedFlattenerMixin, DynamicFieldsMixin, seriali
     dyna_fld_kwarg = 'post_fields'
     def get_content(self, obj):
         self.to_flatten = 'content'
-        return ContentSerializer(
-            obj.content,
-            context = self.context
-        ).data
+        return render(ContentSerializer, obj.content, self.context)
     def get_reply_count(self, obj):
-        try: return obj.comment__count
-        except AttributeError:
-            print("reply_count NO PREFETCH")
-            return obj.comment_set.count()
+        return obj.reply_count
     def get_allocated_to(self, obj):
-        return CommunityPeakSerializer(obj.allocated_to, context=self.context).data
+        return render(CommunityPeakSerializer, obj.allocated_to, self.context)
     def get_total_reacts(self, obj):
-        try: return obj.content__reaction__count
-        except AttributeError: return "USE PREFETCH PLS"
+        return obj.content.total_reacts
+
+    def prime(self, objs):
+        if 'content' in self.fields and 'reactions' in self.context.get('content_flds', ()):
+            ReactionSummaryLoader.of(self.context).prime(obj.content_id for obj in objs)
         
 
 class PostSerializer(PostAndCommentSerializer):
@@ -167,6 +155,7 @@ class PostSerializer(PostAndCommentSerializer):
             'title',
             'is_nsfw',
         )
+        list_serializer_class = PrimedListSerializer
     def update(self, instance, validated_data):
         instance.update(**validated_data)
         instance.content.update(edited = now())
@@ -184,6 +173,7 @@ class CommentSerializer(PostAndCommentSerializer):
     class Meta:
         model = Comment
         fields = ()
+        list_serializer_class = PrimedListSerializer
 
 
 
@@ -212,7 +202,9 @@ class PostCreateSerializer(CommonContentCreateSerializer):
         }
     def create(self, validated_data):
         content = super().create(validated_data)
-        post = Post.objects.create(**validated_data, content=content)
+        post = Post.objects.create(**validated_data, content=content,
+            hot_score = scoring.hot_score(0, 0, content.timestamp))
+        feeds.push_post(post)
         return post
     
 
@@ -230,4 +222,5 @@ class CommentCreateSerializer(CommonContentCreateSerializer):
     def create(self, validated_data):
         content = super().create(validated_data)
         comment = Comment.objects.create(**validated_data, content=content)
+        comment.tally_reply(1)
         return comment
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from communities.models import Membership
+from .models import Comment
+from . import feeds
+
+def _joined(role):
+    return role is not None and role >= Membership.MEMBER
+
+@receiver(post_save, sender=Membership)
+def membership_saved(sender, instance, **kwargs):
+    # joined, got banned or was let back in, the feed is cold now.
+    # visitant rows and promotions between member roles don't touch it
+    if _joined(instance.previous_role) != _joined(instance.role):
+        feeds.drop_feed(instance.user_id)
+
+@receiver(post_delete, sender=Membership)
+def membership_deleted(sender, instance, **kwargs):
+    if _joined(instance.previous_role):
+        feeds.drop_feed(instance.user_id)
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # comments go away through their Content, cascades included
+    instance.tally_reply(-1)
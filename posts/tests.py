@@ -1,3 +1,169 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from communities.models import Community, Membership
+from reacts.models import Icon, ReactionCount
+from .models import Comment, Content, Post
+
+
+class FeedPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='me', email='me@a.a', password='x')
+        community = Community.objects.create(id='cm', name='cm')
+        Membership.objects.create(user=cls.user, community=community)
+        cls.posts = []
+        for i in range(8):
+            content = Content.objects.create(author=cls.user, text=f'p{i}', total_reacts=i % 3)
+            # ties on the sort value, only the pk tells them apart
+            cls.posts.append(Post.objects.create(content=content, title=f'p{i}',
+                allocated_to=community, hot_score=i // 3))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def titles(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [post['title'] for post in response.data]
+
+    def walk(self, query):
+        ''' every page of limit 3, following X-Next-Cursor '''
+        titles, cursor = [], None
+        while True:
+            response = self.client.get(f'/posts/feed/?{query}&limit=3' + (f'&cursor={cursor}' if cursor else ''))
+            titles += self.titles(response)
+            cursor = response.get('X-Next-Cursor')
+            if cursor is None:
+                return titles
+
+    def test_pages_add_up_to_the_whole_list(self):
+        for query in ('', 'sort_by=new', 'sort_by=best'):
+            whole = self.titles(self.client.get(f'/posts/feed/?{query}&limit=100'))
+            self.assertEqual(len(whole), len(self.posts))
+            self.assertEqual(self.walk(query), whole, query)
+
+    def test_hot_ties_are_broken_by_pk(self):
+        self.assertEqual(self.walk(''), ['p7', 'p6', 'p5', 'p4', 'p3', 'p2', 'p1', 'p0'])
+
+    def test_no_cursor_on_a_short_page(self):
+        response = self.client.get('/posts/feed/?limit=100')
+        self.assertNotIn('X-Next-Cursor', response)
+
+    def test_tampered_cursor(self):
+        cursor = self.client.get('/posts/feed/?limit=3')['X-Next-Cursor']
+        response = self.client.get(f'/posts/feed/?cursor={cursor[:-2]}xx')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_of_another_sort_order(self):
+        cursor = self.client.get('/posts/feed/?limit=3')['X-Next-Cursor']
+        response = self.client.get(f'/posts/feed/?sort_by=new&cursor={cursor}')
+        self.assertEqual(response.status_code, 400)
+
+    def test_offset_still_works(self):
+        offset = self.posts[5].pk
+        response = self.client.get(f'/posts/feed/?offset={offset}&limit=3')
+        self.assertEqual(self.titles(response), ['p4', 'p3', 'p2'])
+
+
+class FeedWindowTests(FeedPaginationTests):
+    ''' the same pages with a redis feed holding only the 3 newest posts '''
+    def setUp(self):
+        super().setUp()
+        window = self.posts[:-4:-1]
+        feed = ([post.pk for post in window], window[-1].content.timestamp)
+        patcher = mock.patch('posts.feeds.get_feed', return_value=feed)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def membership_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.titles(self.client.get(url))
+        return [q for q in queries.captured_queries if 'communities_membership' in q['sql']]
+
+    def test_window_pages_skip_the_db_query(self):
+        self.assertEqual(self.membership_queries('/posts/feed/?limit=3'), [])
+        cursor = self.client.get('/posts/feed/?limit=2')['X-Next-Cursor']
+        self.assertEqual(len(self.membership_queries(f'/posts/feed/?limit=2&cursor={cursor}')), 1)
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a, cls.b = [User.objects.create_user(username=name, email=f'{name}@a.a', password='x')
+            for name in ('a', 'b')]
+        cls.community = Community.objects.create(id='cm', name='cm')
+        for user in (cls.a, cls.b):
+            Membership.objects.create(user=user, community=cls.community)
+        cls.icons = [Icon.objects.create(uploader=cls.a, name=f'i{i}', img_src='src') for i in range(2)]
+        cls.content = Content.objects.create(author=cls.a, text='hi')
+        cls.post = Post.objects.create(content=cls.content, title='t', allocated_to=cls.community)
+
+    def client_of(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def react(self, user, icon):
+        response = self.client_of(user).post(f'/reacts/{self.content.pk}', {'icon': self.icons[icon].pk})
+        self.assertEqual(response.status_code, 201)
+
+    def reactions(self):
+        self.content.refresh_from_db()
+        counts = dict(ReactionCount.objects.filter(to=self.content).values_list('icon', 'count'))
+        return self.content.total_reacts, [counts.get(icon.pk, 0) for icon in self.icons]
+
+    def comment(self, user, reply_to=None):
+        data = {'text': 'yo'}
+        if reply_to is not None:
+            data['reply_to'] = reply_to.pk
+        response = self.client_of(user).post(f'/posts/{self.content.pk}/comments/create', data)
+        self.assertEqual(response.status_code, 201)
+        return Comment.objects.get(pk=response.data['id'])
+
+    def test_reaction_counts(self):
+        self.react(self.a, 0)
+        self.react(self.b, 0)
+        self.assertEqual(self.reactions(), (2, [2, 0]))
+        self.react(self.b, 1) # another icon moves it, doesn't add one
+        self.assertEqual(self.reactions(), (2, [1, 1]))
+        self.assertEqual(self.client_of(self.a).delete(f'/reacts/{self.content.pk}').status_code, 204)
+        self.assertEqual(self.reactions(), (1, [0, 1]))
+        # nothing left to take back
+        self.assertEqual(self.client_of(self.a).delete(f'/reacts/{self.content.pk}').status_code, 204)
+        self.assertEqual(self.reactions(), (1, [0, 1]))
+
+    def test_reply_counts(self):
+        first = self.comment(self.a)
+        reply = self.comment(self.b, reply_to=first)
+        self.comment(self.a, reply_to=first)
+        self.post.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual((self.post.reply_count, first.reply_count), (3, 2))
+
+        reply.content.delete()
+        self.post.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual((self.post.reply_count, first.reply_count), (2, 1))
+
+        first.content.delete() # takes its last reply with it
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.reply_count, 0)
 
-# Create your tests here.
+    def test_reconcile_counters_fixes_drift(self):
+        self.react(self.a, 0)
+        self.comment(self.b)
+        Content.objects.filter(pk=self.content.pk).update(total_reacts=7)
+        Post.objects.filter(pk=self.post.pk).update(reply_count=0)
+        ReactionCount.objects.all().delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.reactions(), (1, [1, 0]))
+        self.assertEqual(self.post.reply_count, 1)
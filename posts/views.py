@@ -23,7 +23,7 @@ from .permissions import (
     IsMemberOrPublicPostsOnly
 )
 
-from . import serializers
+from . import serializers, feeds
 from accounts.serializers import UserPeakSerializer
 
 from bubblyb.utils import (
@@ -46,7 +46,7 @@ def sort_posts(get_filtered):
                 if last:
                     last = int(last) if last.isdigit() else 0
                     qs = qs.filter(content__timestamp__gte = now()-timedelta(days=last))
-                self.paginate_kwargs = ('-content__reaction__count', '-content__timestamp')
+                self.paginate_kwargs = ('-content__total_reacts', '-content__timestamp')
         return qs
     return sorter
 
@@ -88,10 +88,6 @@ def posts_aggregate(get_qs): # for comment and post qs
                 to_attr = "my_react"
             ),
         )
-        qs = qs.annotate(
-            Count('comment', distinct=True),
-            Count('content__reaction', distinct=True),
-        )
         return qs
     return aggregator
 
@@ -108,16 +104,61 @@ class PostFeedAPIView(PaginationMixin, generics.ListAPIView):
         context['profile_flds'] = ('fave_color',)
         return context
 
+    # pages come from the user's redis feed while they start inside its
+    # window of newest posts, the older posts after it come from the db.
+    # window_start is the timestamp the window reaches back to
+    window_start = None
+    past_window = False
+    topping_up = False
+
+    def in_window(self, ids):
+        after = self.cursor_pk()
+        try:
+            return after is None or int(after) in ids
+        except ValueError: # bad offset, get_cursor ignores it too
+            return True
+
+    def get_cursor(self, qs):
+        if self.topping_up: # the older posts start from the top
+            return None
+        return super().get_cursor(qs)
+
     # @perf_timer
     @sort_posts
     @posts_aggregate
     def get_big_queryset(self):
         qs = Post.objects.all()
+        if not self.past_window:
+            feed = feeds.get_feed(self.request.user)
+            if feed is None: # cold feed, warm it up for next time
+                feeds.rebuild_feed(self.request.user)
+            elif feed[1] is None: # holds every post, pages of any depth can come from it
+                return qs.filter(pk__in = feed[0])
+            # best ranks all of the posts, a window of the newest can't stand in for it
+            elif self.request.query_params.get('sort_by') != 'best':
+                ids, self.window_start = set(feed[0]), feed[1]
+                if self.in_window(ids):
+                    return qs.filter(pk__in = ids)
+                self.past_window = True
         qs = qs.filter(
             allocated_to__in = Membership.get_joined_communities(self.request.user)
         )
+        if self.past_window:
+            qs = qs.filter(content__timestamp__lt = self.window_start)
         return qs
 
+    def get_queryset(self):
+        page = super().get_queryset()
+        if self.window_start is None or self.past_window:
+            return page
+        page = list(page)
+        if len(page) < self.page_limit: # the window ran out, fill up with older posts
+            self.past_window = self.topping_up = True
+            page_limit = self.page_limit
+            page += super().get_queryset()[:page_limit - len(page)]
+            self.page_limit, self.topping_up = page_limit, False
+        return page
+
 
 class PostSearchAPIView(SrchCompatiblePgnationMixin, PostFeedAPIView):
     permission_classes = ()
@@ -232,10 +273,6 @@ class CommentListAPIView(PaginationMixin, GetPostMixin, generics.ListAPIView):
                 to_attr = "my_react"
             ),
         )
-        qs = qs.annotate(
-            Count('comment', distinct=True),
-            Count('content__reaction', distinct=True),
-        )
 
         get_replies = self.request.query_params.get('is_reply')
         if get_replies == "1":
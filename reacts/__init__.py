@@ -0,0 +1 @@
+default_app_config = 'reacts.apps.ReactsConfig'
\ No newline at end of file
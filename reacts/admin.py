@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Icon, Reaction
+from .models import Icon, Reaction, ReactionCount
 
 admin.site.register(Icon)
-admin.site.register(Reaction)
\ No newline at end of file
+admin.site.register(Reaction)
+admin.site.register(ReactionCount)
\ No newline at end of file
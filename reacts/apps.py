@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ReactsConfig(AppConfig):
+    name = 'reacts'
+
+    def ready(self):
+        import reacts.signals #noqa
@@ -0,0 +1,30 @@
+'''
+Icons barely ever change but get looked up all the time.
+Cached by id and as the list of a community's active icons
+'''
+from bubblyb.utils import TwoTierCache
+
+from .models import Icon
+
+icons = TwoTierCache('icon')
+cmty_icons = TwoTierCache('cmty_icons', maxsize=256)
+
+
+def get_icon(icon_id):
+    try:
+        icon_id = int(icon_id)
+    except (TypeError, ValueError):
+        return None
+    return icons.get(icon_id, lambda: Icon.objects.filter(pk=icon_id).first())
+
+def get_icons(icon_ids):
+    ''' {id: Icon}, one query at most for whatever is not cached '''
+    return icons.get_many(list(icon_ids), lambda missing: Icon.objects.in_bulk(missing))
+
+def get_cmty_icons(community_id):
+    return cmty_icons.get(community_id,
+        lambda: list(Icon.objects.filter(belongs_to=community_id, active=True)))
+
+def forget(icon):
+    icons.delete(icon.pk)
+    cmty_icons.delete(icon.belongs_to_id)
@@ -0,0 +1,33 @@
+from bubblyb.utils import BatchLoader
+
+from .models import ReactionCount
+from . import icon_cache
+
+
+class ReactionSummaryLoader(BatchLoader):
+    ''' per icon reaction counts of contents, with the icon's name and img_src '''
+    context_key = 'reaction_summary'
+    empty = ()
+    with_icons = True
+
+    def batch_load(self, content_ids):
+        rows = list(ReactionCount.objects.filter(to__in=content_ids, count__gt=0)
+            .order_by('icon_id').values_list('to', 'icon', 'count'))
+        if self.with_icons:
+            icons = icon_cache.get_icons({icon_id for _, icon_id, _ in rows})
+
+        summaries = {}
+        for content_id, icon_id, count in rows:
+            if self.with_icons:
+                icon = icons[icon_id]
+                summary = {'icon_id': icon_id, 'name': icon.name, 'img_src': icon.img_src, 'count': count}
+            else:
+                summary = {'icon_id': icon_id, 'count': count}
+            summaries.setdefault(content_id, []).append(summary)
+        return summaries
+
+
+class ReactionCountLoader(ReactionSummaryLoader):
+    ''' just icon_id and count, for the react endpoint '''
+    context_key = 'reaction_counts'
+    with_icons = False
@@ -37,11 +37,37 @@ class Icon(models.Model):
     # class Meta:
     #     unique_together = ('belongs_to', 'name')
 
+class ReactionManager(models.Manager):
+    def tally(self, content_id, icon_id, delta):
+        ''' keeps Content.total_reacts and the per icon ReactionCount in step '''
+        Content.objects.filter(pk=content_id, total_reacts__gte=-delta) \
+            .update(total_reacts=models.F('total_reacts') + delta)
+        if delta > 0:
+            ReactionCount.objects.get_or_create(to_id=content_id, icon_id=icon_id)
+        ReactionCount.objects.filter(to_id=content_id, icon_id=icon_id, count__gte=-delta) \
+            .update(count=models.F('count') + delta)
+
+    def unreact(self, user, to):
+        for old in self.filter(user=user, to=to): # unique_together, at most one
+            old.delete()
+            self.tally(old.to_id, old.icon_id, -1)
+
 class Reaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     icon = models.ForeignKey(Icon, on_delete=models.PROTECT, default=1)
     to = models.ForeignKey(Content, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now=True)
 
+    objects = ReactionManager()
+
     class Meta:
         unique_together = ('user', 'to')
+
+class ReactionCount(models.Model):
+    ''' Denormalized, fix drift with manage.py reconcile_counters '''
+    to = models.ForeignKey(Content, on_delete=models.CASCADE)
+    icon = models.ForeignKey(Icon, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('to', 'icon')
@@ -3,6 +3,8 @@ from rest_framework import serializers
 # from django.contrib.contenttypes.fields import GenericRelation
 
 from .models import Reaction, Icon
+from .loaders import ReactionCountLoader
+from . import icon_cache
 from communities.models import Community
 # from notification.models import Notification
 
@@ -45,6 +47,14 @@ class IncludedpostRelatedField(serializers.RelatedField):
 '''
 
 
+class CachedIconField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        icon = icon_cache.get_icon(data)
+        if icon is None:
+            self.fail('does_not_exist', pk_value=data)
+        return icon
+
+
 class IconCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Icon
@@ -78,10 +88,11 @@ class MyIconsSerializer(serializers.ModelSerializer):
             'icons',
         )
     def get_icons(self, cmty):
-        return IconListSerializer(cmty.icon_set.filter(active=True), many=True).data
+        return IconListSerializer(icon_cache.get_cmty_icons(cmty.id), many=True).data
 
 
 class ReactionCreateSerializer(serializers.ModelSerializer):
+    icon = CachedIconField(queryset=Icon.objects.all(), required=False) # Reaction.icon has a default
     class Meta:
         model = Reaction
         fields = (
@@ -89,10 +100,10 @@ class ReactionCreateSerializer(serializers.ModelSerializer):
         )
     def to_representation(self, obj):
         return { 
-            'reactions': obj.to.reaction_set.values('icon_id').annotate(count=Count('icon_id'))
+            'reactions': ReactionCountLoader.of(self.context).load(obj.to_id)
         }
     def validate_icon(self, value):
-        if not (value.belongs_to == self.context['content'].allocated_to or value.belongs_to==None):
+        if value.belongs_to_id not in (self.context['content'].allocated_to.pk, None):
             raise serializers.ValidationError("Icon not in this community")
 
         if not value.active:
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Icon
+from . import icon_cache
+
+@receiver([post_save, post_delete], sender=Icon)
+def icon_changed(sender, instance, **kwargs):
+    # covers IconCreateAPIView and IconEditAPIView too
+    icon_cache.forget(instance)
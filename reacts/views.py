@@ -7,12 +7,13 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.exceptions import APIException
 
-from django.db.models import Count
+from django.db import transaction
 
 from . import serializers
 
 from communities.models import Membership
 from .models import Reaction
+from .loaders import ReactionCountLoader
 
 
 from posts.views import GetPostMixin
@@ -31,7 +32,6 @@ class IconListAPIView(PaginationMixin, generics.ListAPIView):
     paginate_limit = 6
     def get_big_queryset(self):
         qs = Membership.get_joined_communities(self.request.user)
-        qs = qs.prefetch_related('icon_set')
         return qs
 
 
@@ -47,15 +47,19 @@ class ReactionCreateAPIView(GetPostMixin, generics.CreateAPIView):
     def perform_create(self, serializer):
         u = self.request.user
         to = serializer.context['content']
-        Reaction.objects.filter(user=u, to=to).delete()
-        serializer.save(user=u, to=to)
+        with transaction.atomic():
+            Reaction.objects.unreact(u, to)
+            reaction = serializer.save(user=u, to=to)
+            Reaction.objects.tally(reaction.to_id, reaction.icon_id, 1)
 
     def get(self, request, **kwargs):
+        context = self.get_serializer_context()
         return Response(
-            {'reactions': self.get_content_object().reaction_set.values('icon_id').annotate(count=Count('icon_id'))},
+            {'reactions': ReactionCountLoader.of(context).load(context['content'].id)},
             status = status.HTTP_200_OK
         )
 
     def delete(self, request, **kwargs):
-        Reaction.objects.filter(user=request.user, to=self.get_content_object()).delete()
+        with transaction.atomic():
+            Reaction.objects.unreact(request.user, self.get_content_object())
         return Response(status = status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -0,0 +1,46 @@
+from bubblyb.utils import BatchLoader
+
+from .models import Relationship, Block
+
+
+class EdgeLoader(BatchLoader):
+    '''
+    Whether there is a follow/block edge between the request user and
+    each username on the page, one query for the whole page
+    '''
+    empty = False
+    model = None
+    me_field = ''   # the request user's end of the edge
+    them_field = '' # the page's end
+
+    def batch_load(self, usernames):
+        me = self.context['request'].user
+        if me.is_anonymous:
+            return {}
+        found = self.model.objects.filter(**{
+            self.me_field: me,
+            f'{self.them_field}__in': usernames,
+        }).values_list(self.them_field, flat=True)
+        return {username: True for username in found}
+
+
+class YouFollowLoader(EdgeLoader):
+    context_key = 'you_follow'
+    model, me_field, them_field = Relationship, 'from_user', 'to_user'
+
+class FollowsYouLoader(EdgeLoader):
+    context_key = 'follows_you'
+    model, me_field, them_field = Relationship, 'to_user', 'from_user'
+
+class YouBlockLoader(EdgeLoader):
+    context_key = 'you_block'
+    model, me_field, them_field = Block, 'blocker', 'got_blokt'
+
+class BlocksYouLoader(EdgeLoader):
+    context_key = 'blocks_you'
+    model, me_field, them_field = Block, 'got_blokt', 'blocker'
+
+# serializer field -> loader
+EDGE_LOADERS = {loader.context_key: loader for loader in (
+    YouFollowLoader, FollowsYouLoader, YouBlockLoader, BlocksYouLoader
+)}